@@ -1,10 +1,15 @@
-from flask import Flask, render_template, request, jsonify, make_response, send_from_directory, redirect, url_for
+from flask import Flask, render_template, request, jsonify, make_response, send_from_directory, redirect, url_for, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, func, or_, and_, inspect
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.middleware.proxy_fix import ProxyFix
 import datetime
+import json
+import threading
+import time
+from collections import OrderedDict
 import uuid
 import base64
 import os
@@ -13,6 +18,9 @@ from dotenv import load_dotenv
 import pytz
 from werkzeug.utils import secure_filename
 from PIL import Image
+from db_routing import RoutingSession, init_replicas, read_replica
+from rate_limit import init_rate_limits
+import migrations
 
 load_dotenv()
 
@@ -21,15 +29,63 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Read replicas for dashboard queries (comma-separated URLs); empty means primary only
+app.config['SQLALCHEMY_REPLICA_URIS'] = [u.strip() for u in os.getenv('REPLICA_DATABASE_URLS', '').split(',') if u.strip()]
+app.config['REPLICA_MAX_LAG_SECONDS'] = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '5'))
+app.config['REPLICA_LAG_CHECK_INTERVAL'] = float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', '2'))
+app.config['REPLICA_CONNECT_TIMEOUT'] = float(os.getenv('REPLICA_CONNECT_TIMEOUT', '2'))
+app.config['READ_YOUR_WRITES_SECONDS'] = float(os.getenv('READ_YOUR_WRITES_SECONDS', '10'))
+
+# Public pixel/click hits beyond these rates still get their response but are not stored.
+# Limits are per process.
+# Reverse proxies in front of the app (nginx in docker-compose). Their appended
+# X-Forwarded-For hop becomes request.remote_addr, which rate limiting is keyed on;
+# the first X-Forwarded-For entry is client-supplied and only used for display.
+# Set it to 0 whenever clients can reach the app without going through the proxy.
+TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', '1'))
+app.config['RATE_LIMIT_ENABLED'] = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() != 'false'
+app.config['RATE_LIMIT_IP_PER_MINUTE'] = float(os.getenv('RATE_LIMIT_IP_PER_MINUTE', '600'))
+app.config['RATE_LIMIT_IP_BURST'] = int(os.getenv('RATE_LIMIT_IP_BURST', '100'))
+app.config['RATE_LIMIT_TRACKING_PER_MINUTE'] = float(os.getenv('RATE_LIMIT_TRACKING_PER_MINUTE', '10'))
+app.config['RATE_LIMIT_TRACKING_BURST'] = int(os.getenv('RATE_LIMIT_TRACKING_BURST', '20'))
+app.config['RATE_LIMIT_SKETCH_WIDTH'] = int(os.getenv('RATE_LIMIT_SKETCH_WIDTH', '65536'))
+app.config['RATE_LIMIT_SKETCH_DEPTH'] = int(os.getenv('RATE_LIMIT_SKETCH_DEPTH', '4'))
+
 # Image upload configuration
 UPLOAD_FOLDER = 'frontend/static/uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
 
+# Event lists in the details view are paginated so heavily-opened emails stay cheap
+DETAILS_PAGE_SIZE = int(os.getenv('DETAILS_PAGE_SIZE', '50'))
+DETAILS_MAX_PAGE_SIZE = int(os.getenv('DETAILS_MAX_PAGE_SIZE', '500'))
+
+# Rows per chunk when streaming a full tracking history
+TRACKING_STREAM_BATCH_SIZE = 500
+# Incremental refreshes re-read rows changed this long before the previous fetch, so
+# writes that committed late (or reached the replica late) are not missed
+TRACKING_CHANGES_OVERLAP_SECONDS = int(os.getenv('TRACKING_CHANGES_OVERLAP_SECONDS', '60'))
+# A refresh further behind than this, or with more changes than this, reloads the list instead
+TRACKING_CHANGES_MAX_AGE_SECONDS = int(os.getenv('TRACKING_CHANGES_MAX_AGE_SECONDS', '3600'))
+TRACKING_CHANGES_MAX_ROWS = int(os.getenv('TRACKING_CHANGES_MAX_ROWS', '1000'))
+# Rows per stream when an admin lists every user's emails; older ones load on request
+TRACKING_STREAM_ADMIN_LIMIT = int(os.getenv('TRACKING_STREAM_ADMIN_LIMIT', '1000'))
+
+ADMIN_USERS_PAGE_SIZE = 50
+ADMIN_USERS_MAX_PAGE_SIZE = 200
+
+# Public tracking tokens resolved to email_tracking.id, kept per process
+TRACKING_ID_CACHE_SIZE = int(os.getenv('TRACKING_ID_CACHE_SIZE', '100000'))
+
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-db = SQLAlchemy(app)
+if TRUSTED_PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_COUNT, x_proto=0)
+
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+init_replicas(app)
+tracking_rate_limiter = init_rate_limits(app)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 CORS(app)
@@ -44,6 +100,14 @@ def allowed_file(filename):
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
+    # The admin list sorts on these, with id as the tie-breaker
+    __table_args__ = (
+        db.Index('ix_users_created_at_id', 'created_at', 'id'),
+        db.Index('ix_users_tracking_count_id', 'tracking_count', 'id'),
+        db.Index('ix_users_total_opens_id', 'total_opens', 'id'),
+        db.Index('ix_users_total_clicks_id', 'total_clicks', 'id'),
+        db.Index('ix_users_last_activity_id', 'last_activity', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False, index=True)
     email = db.Column(db.String(255), unique=True, nullable=False, index=True)
@@ -52,6 +116,13 @@ class User(UserMixin, db.Model):
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
 
+    # Kept up to date by send_email and the public tracking routes, so the admin
+    # list can sort on them without aggregating email_tracking
+    tracking_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    total_opens = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    total_clicks = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_activity = db.Column(db.DateTime, nullable=True)
+
     # Relationships
     smtp_configs = db.relationship('SMTPConfig', backref='user', lazy=True, cascade='all, delete-orphan')
     email_tracking = db.relationship('EmailTracking', backref='user', lazy=True, cascade='all, delete-orphan')
@@ -99,6 +170,11 @@ class SMTPConfig(db.Model):
 
 class EmailTracking(db.Model):
     __tablename__ = 'email_tracking'
+    __table_args__ = (
+        db.Index('ix_email_tracking_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_email_tracking_updated_at', 'updated_at'),
+        db.Index('ix_email_tracking_user_id_updated_at', 'user_id', 'updated_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     tracking_id = db.Column(db.String(64), unique=True, nullable=False, index=True)
@@ -110,11 +186,24 @@ class EmailTracking(db.Model):
     last_click_time = db.Column(db.DateTime, nullable=True)
     last_ip = db.Column(db.String(100), nullable=True)
     last_port = db.Column(db.String(10), nullable=True)
+    last_latitude = db.Column(db.Float, nullable=True)
+    last_longitude = db.Column(db.Float, nullable=True)
+    last_location = db.Column(db.String(255), nullable=True)
     created_at = db.Column(db.DateTime, default=lambda: get_egypt_time().replace(tzinfo=None))
+    # UTC time of the last change to anything the tracking list shows; drives incremental
+    # refreshes. NULL for rows untouched since the column was added.
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.datetime.utcnow,
+                           onupdate=datetime.datetime.utcnow)
 
     # Relationships
-    open_events = db.relationship('OpenEvent', backref='tracking', lazy=True, cascade='all, delete-orphan')
-    click_events = db.relationship('ClickEvent', backref='tracking', lazy=True, cascade='all, delete-orphan')
+    open_events = db.relationship('OpenEvent', backref='tracking', lazy=True, cascade='all, delete-orphan',
+                                  foreign_keys='OpenEvent.email_tracking_id')
+    click_events = db.relationship('ClickEvent', backref='tracking', lazy=True, cascade='all, delete-orphan',
+                                   foreign_keys='ClickEvent.email_tracking_id')
+
+    # Keys of to_dict(), in order; the header of the columnar API format
+    COLUMNS = ('id', 'tracking_id', 'recipient_email', 'subject', 'open_count', 'click_count', 'last_open_time',
+               'last_click_time', 'last_ip', 'last_port', 'last_location', 'created_at')
 
     def to_dict(self):
         return {
@@ -128,13 +217,21 @@ class EmailTracking(db.Model):
             'last_click_time': to_egypt_dict_time(self.last_click_time),
             'last_ip': self.last_ip,
             'last_port': self.last_port,
+            'last_location': self.last_location,
             'created_at': to_egypt_dict_time(self.created_at)
         }
 
 class ClickEvent(db.Model):
     __tablename__ = 'click_events'
+    __table_args__ = (
+        db.Index('ix_click_events_email_tracking_id_click_time', 'email_tracking_id', 'click_time'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    tracking_id = db.Column(db.String(64), db.ForeignKey('email_tracking.tracking_id'), nullable=False, index=True)
+    # Integer key instead of the 32-char public token: smaller indexes, cheaper joins.
+    # tracking_id is still written for processes running the previous release and is
+    # dropped by the contract migration (migrations/versions/0006).
+    email_tracking_id = db.Column(db.Integer, db.ForeignKey('email_tracking.id'), nullable=False)
+    tracking_id = db.Column(db.String(64), db.ForeignKey('email_tracking.tracking_id'), nullable=True)
     click_time = db.Column(db.DateTime, default=lambda: get_egypt_time().replace(tzinfo=None), nullable=False)
     ip_address = db.Column(db.String(100), nullable=True)
     port = db.Column(db.String(10), nullable=True)
@@ -143,7 +240,7 @@ class ClickEvent(db.Model):
     def to_dict(self):
         return {
             'id': self.id,
-            'tracking_id': self.tracking_id,
+            'email_tracking_id': self.email_tracking_id,
             'click_time': to_egypt_dict_time(self.click_time),
             'ip_address': self.ip_address,
             'port': self.port,
@@ -152,20 +249,33 @@ class ClickEvent(db.Model):
 
 class OpenEvent(db.Model):
     __tablename__ = 'open_events'
+    __table_args__ = (
+        db.Index('ix_open_events_email_tracking_id_open_time', 'email_tracking_id', 'open_time'),
+        db.Index('ix_open_events_geo_checked_at_id', 'geo_checked_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    tracking_id = db.Column(db.String(64), db.ForeignKey('email_tracking.tracking_id'), nullable=False, index=True)
+    email_tracking_id = db.Column(db.Integer, db.ForeignKey('email_tracking.id'), nullable=False)
+    tracking_id = db.Column(db.String(64), db.ForeignKey('email_tracking.tracking_id'), nullable=True)
     open_time = db.Column(db.DateTime, default=lambda: get_egypt_time().replace(tzinfo=None), nullable=False)
     ip_address = db.Column(db.String(100), nullable=True)
     port = db.Column(db.String(10), nullable=True)
     user_agent = db.Column(db.Text, nullable=True)
+    # Filled in later by geoip_worker.py so the pixel path never waits on a lookup
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    location = db.Column(db.String(255), nullable=True)
+    geo_checked_at = db.Column(db.DateTime, nullable=True)
 
     def to_dict(self):
         return {
             'id': self.id,
-            'tracking_id': self.tracking_id,
+            'email_tracking_id': self.email_tracking_id,
             'open_time': to_egypt_dict_time(self.open_time),
             'ip_address': self.ip_address,
             'port': self.port,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'location': self.location,
             'user_agent': self.user_agent
         }
 
@@ -211,6 +321,73 @@ def get_client_port():
 def generate_tracking_id():
     return uuid.uuid4().hex
 
+class TrackingIdCache:
+    """Bounded LRU map of public tracking token -> (email_tracking.id, user_id).
+
+    Only hits are cached: a pixel can be fetched before send_email has
+    committed its row, and that token must still resolve afterwards.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, tracking_id):
+        with self._lock:
+            keys = self._entries.get(tracking_id)
+            if keys is not None:
+                self._entries.move_to_end(tracking_id)
+            return keys
+
+    def set(self, tracking_id, keys):
+        with self._lock:
+            self._entries[tracking_id] = keys
+            self._entries.move_to_end(tracking_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, tracking_id):
+        with self._lock:
+            self._entries.pop(tracking_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+tracking_id_cache = TrackingIdCache(TRACKING_ID_CACHE_SIZE)
+
+def resolve_tracking_id(tracking_id):
+    # (email_tracking.id, user_id) for a public token, or None if it is unknown
+    keys = tracking_id_cache.get(tracking_id)
+    if keys is None:
+        row = db.session.query(EmailTracking.id, EmailTracking.user_id).filter_by(tracking_id=tracking_id).first()
+        if row is not None:
+            keys = (row.id, row.user_id)
+            tracking_id_cache.set(tracking_id, keys)
+    return keys
+
+# Revision after which every event row carries email_tracking_id
+EVENT_KEYS_REVISION = '0005'
+EVENT_KEYS_RECHECK_SECONDS = 60
+_event_keys = {'ready': False, 'checked_at': None}
+
+def event_keys_backfilled():
+    # Once true it stays true; until then re-check now and then, so finishing the
+    # backfill with migrate_db.py does not need a restart
+    now = time.monotonic()
+    if not _event_keys['ready'] and (_event_keys['checked_at'] is None
+                                     or now - _event_keys['checked_at'] > EVENT_KEYS_RECHECK_SECONDS):
+        _event_keys['checked_at'] = now
+        _event_keys['ready'] = EVENT_KEYS_REVISION in migrations.applied_revisions(db.engine)
+    return _event_keys['ready']
+
+def events_of(model, tracking):
+    # Events written before the backfill have no integer key yet
+    if event_keys_backfilled():
+        return model.email_tracking_id == tracking.id
+    return model.tracking_id == tracking.tracking_id
+
 def create_email_body_with_image(image_url, tracking_id, redirect_url='https://www.google.com', body_text=""):
     base_url = request.url_root.rstrip('/')
     if image_url and not image_url.startswith('http'):
@@ -300,14 +477,72 @@ def get_current_user():
 
 # ============ USER MANAGEMENT (ADMIN ONLY) ============
 
+# Each is unique or indexed together with id, so a page is read off an index
+USER_SORT_COLUMNS = {
+    'username': User.username,
+    'email': User.email,
+    'created_at': User.created_at,
+    'tracking_count': User.tracking_count,
+    'total_opens': User.total_opens,
+    'total_clicks': User.total_clicks,
+    'last_activity': User.last_activity
+}
+
 @app.route('/api/admin/users', methods=['GET'])
 @login_required
+@read_replica
 def get_all_users():
     if not current_user.is_admin:
         return jsonify({'success': False, 'message': 'Admin access required'}), 403
 
-    users = User.query.all()
-    return jsonify({'success': True, 'users': [u.to_dict() for u in users]})
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = max(1, min(request.args.get('per_page', ADMIN_USERS_PAGE_SIZE, type=int), ADMIN_USERS_MAX_PAGE_SIZE))
+    search = request.args.get('search', '')
+    sort = request.args.get('sort', 'created_at')
+    descending = request.args.get('order', 'desc') != 'asc'
+
+    if sort not in USER_SORT_COLUMNS:
+        return jsonify({'success': False, 'message': f'Invalid sort field: {sort}'}), 400
+
+    query = User.query
+    if search:
+        query = query.filter(or_(User.username.contains(search), User.email.contains(search)))
+
+    sort_column = USER_SORT_COLUMNS[sort]
+    order = sort_column.desc() if descending else sort_column.asc()
+    if sort_column.unique:
+        query = query.order_by(order)
+    else:
+        tie_breaker = User.id.desc() if descending else User.id.asc()
+        query = query.order_by(order, tie_breaker)
+
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    if pagination.pages and page > pagination.pages:
+        # e.g. the last user on the last page was deleted: show the new last page
+        pagination = query.paginate(page=pagination.pages, per_page=per_page, error_out=False)
+
+    users = [
+        dict(
+            user.to_dict(),
+            tracking_count=user.tracking_count,
+            total_opens=user.total_opens,
+            total_clicks=user.total_clicks,
+            last_activity=to_egypt_dict_time(user.last_activity)
+        )
+        for user in pagination.items
+    ]
+
+    return jsonify({
+        'success': True,
+        'users': users,
+        'total': pagination.total,
+        'total_admins': User.query.filter_by(is_admin=True).count(),
+        'pages': pagination.pages,
+        'current_page': pagination.page,
+        'per_page': per_page,
+        'sort': sort,
+        'order': 'desc' if descending else 'asc'
+    })
 
 @app.route('/api/admin/users/<int:user_id>', methods=['DELETE'])
 @login_required
@@ -324,6 +559,7 @@ def delete_user(user_id):
 
     db.session.delete(user)
     db.session.commit()
+    tracking_id_cache.clear()
 
     return jsonify({'success': True, 'message': 'User deleted successfully'})
 
@@ -446,6 +682,7 @@ def send_email():
         from email.mime.multipart import MIMEMultipart
 
         results = []
+        created = 0
 
         for email in emails:
             try:
@@ -458,6 +695,7 @@ def send_email():
                     subject=subject
                 )
                 db.session.add(tracking)
+                created += 1
 
                 email_body, click_url = create_email_body_with_image(image_url, tracking_id, redirect_url, body_text)
 
@@ -489,6 +727,9 @@ def send_email():
                     'error': str(e)
                 })
 
+        User.query.filter_by(id=current_user.id).update({
+            User.tracking_count: User.tracking_count + created
+        }, synchronize_session=False)
         db.session.commit()
 
         return jsonify({
@@ -503,85 +744,316 @@ def send_email():
 
 # ============ TRACKING ROUTES ============
 
-@app.route('/api/tracking', methods=['GET'])
-@login_required
-def get_tracking_data():
-    page = request.args.get('page', 1, type=int)
-    search = request.args.get('search', '')
-    per_page = 50
+def wants_columnar():
+    return request.args.get('format') == 'columnar'
+
+def to_columnar(records, columns):
+    # Column names once, then one array of values per record, instead of repeating every key per row
+    return {'columns': list(columns), 'rows': [[record[c] for c in columns] for record in records]}
 
+def get_tracking_query():
     query = EmailTracking.query
 
     # If not admin, only show own emails
     if not current_user.is_admin:
         query = query.filter_by(user_id=current_user.id)
+    else:
+        user_id = request.args.get('user_id', type=int)
+        if user_id:
+            query = query.filter_by(user_id=user_id)
 
+    search = request.args.get('search', '')
     if search:
         query = query.filter(EmailTracking.recipient_email.contains(search))
 
-    pagination = query.order_by(EmailTracking.created_at.desc()).paginate(
+    return query.order_by(EmailTracking.created_at.desc(), EmailTracking.id.desc())
+
+def get_tracking_stream_limit():
+    # One user's history streams in full; every user's at once is capped
+    limit = request.args.get('limit', type=int)
+    if current_user.is_admin and not request.args.get('user_id', type=int):
+        limit = min(limit, TRACKING_STREAM_ADMIN_LIMIT) if limit else TRACKING_STREAM_ADMIN_LIMIT
+    return max(1, limit) if limit else None
+
+def tracking_row(item):
+    record = item.to_dict()
+    return [record[c] for c in EmailTracking.COLUMNS]
+
+@app.route('/api/tracking', methods=['GET'])
+@login_required
+@read_replica
+def get_tracking_data():
+    page = request.args.get('page', 1, type=int)
+    per_page = 50
+
+    pagination = get_tracking_query().paginate(
         page=page, per_page=per_page, error_out=False
     )
 
-    return jsonify({
+    items = [item.to_dict() for item in pagination.items]
+    response = {
         'success': True,
-        'data': [item.to_dict() for item in pagination.items],
         'total': pagination.total,
         'pages': pagination.pages,
         'current_page': page,
         'per_page': per_page
+    }
+    if wants_columnar():
+        response.update(to_columnar(items, EmailTracking.COLUMNS))
+    else:
+        response['data'] = items
+
+    return jsonify(response)
+
+@app.route('/api/tracking/stream', methods=['GET'])
+@login_required
+@read_replica
+def stream_tracking_data():
+    # The (filtered) history as NDJSON: a header line with the column names, total,
+    # limit and as_of (the "since" for /api/tracking/changes), then one JSON array
+    # per row, sent in chunks as they are read from the DB. ?before=<id> continues
+    # after that row, for lists cut off by the limit.
+    as_of = datetime.datetime.utcnow()
+    query = get_tracking_query()
+    limit = get_tracking_stream_limit()
+
+    before = request.args.get('before', type=int)
+    if before:
+        anchor = db.session.query(EmailTracking.created_at, EmailTracking.id).filter_by(id=before).first()
+        if not anchor:
+            return jsonify({'success': False, 'message': 'Unknown row in before'}), 400
+        # Keyset on the list order (created_at desc, id desc)
+        query = query.filter(or_(
+            EmailTracking.created_at < anchor.created_at,
+            and_(EmailTracking.created_at == anchor.created_at, EmailTracking.id < anchor.id)
+        ))
+        total = None
+    else:
+        total = query.order_by(None).count()
+
+    if limit:
+        query = query.limit(limit)
+
+    def generate():
+        header = {'columns': EmailTracking.COLUMNS, 'total': total, 'limit': limit, 'as_of': as_of.isoformat()}
+        yield json.dumps(header) + '\n'
+
+        lines = []
+        for item in query.yield_per(TRACKING_STREAM_BATCH_SIZE):
+            lines.append(json.dumps(tracking_row(item), separators=(',', ':')))
+            if len(lines) >= TRACKING_STREAM_BATCH_SIZE:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
     })
 
-@app.route('/api/tracking/<tracking_id>/details', methods=['GET'])
+@app.route('/api/tracking/changes', methods=['GET'])
 @login_required
-def get_tracking_details(tracking_id):
+@read_replica
+def get_tracking_changes():
+    # Rows of the same (filtered) list created or updated since a previous stream or
+    # changes response, for periodic refreshes; served by the updated_at indexes.
+    # Deleted rows are not reported; the admin actions that delete reload the list.
+    # A client too far behind gets reload: true instead of an unbounded result.
+    try:
+        since = datetime.datetime.fromisoformat(request.args['since'])
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid or missing since'}), 400
+
+    as_of = datetime.datetime.utcnow()
+    response = {'success': True, 'as_of': as_of.isoformat(), 'columns': list(EmailTracking.COLUMNS),
+                'rows': [], 'reload': True}
+    if as_of - since > datetime.timedelta(seconds=TRACKING_CHANGES_MAX_AGE_SECONDS):
+        return jsonify(response)
+
+    changed_after = since - datetime.timedelta(seconds=TRACKING_CHANGES_OVERLAP_SECONDS)
+    items = get_tracking_query().filter(EmailTracking.updated_at > changed_after).limit(
+        TRACKING_CHANGES_MAX_ROWS + 1
+    ).all()
+    if len(items) > TRACKING_CHANGES_MAX_ROWS:
+        return jsonify(response)
+
+    response.update(rows=[tracking_row(item) for item in items], reload=False)
+    return jsonify(response)
+
+def get_accessible_tracking(tracking_id):
     tracking = EmailTracking.query.filter_by(tracking_id=tracking_id).first()
     if not tracking:
-        return jsonify({'success': False, 'message': 'Tracking record not found'}), 404
+        return None, (jsonify({'success': False, 'message': 'Tracking record not found'}), 404)
 
     # Check access
     if not current_user.is_admin and tracking.user_id != current_user.id:
-        return jsonify({'success': False, 'message': 'Access denied'}), 403
+        return None, (jsonify({'success': False, 'message': 'Access denied'}), 403)
+
+    return tracking, None
+
+OPEN_DETAIL_COLUMNS = ('id', 'open_time', 'ip', 'port', 'location', 'latitude', 'longitude')
+CLICK_DETAIL_COLUMNS = ('id', 'click_time', 'ip', 'port')
+
+def open_event_detail(e):
+    return {'id': e.id, 'open_time': to_egypt_dict_time(e.open_time), 'ip': e.ip_address or 'Unknown', 'port': e.port or 'Unknown',
+            'location': e.location, 'latitude': e.latitude, 'longitude': e.longitude}
+
+def click_event_detail(e):
+    return {'id': e.id, 'click_time': to_egypt_dict_time(e.click_time), 'ip': e.ip_address or 'Unknown', 'port': e.port or 'Unknown'}
+
+EVENT_TYPES = {
+    'opens': (OpenEvent, OpenEvent.open_time, open_event_detail, OPEN_DETAIL_COLUMNS),
+    'clicks': (ClickEvent, ClickEvent.click_time, click_event_detail, CLICK_DETAIL_COLUMNS)
+}
+
+def encode_event_cursor(event_time, event_id):
+    return base64.urlsafe_b64encode(f"{event_time.isoformat()}|{event_id}".encode()).decode()
+
+def decode_event_cursor(cursor):
+    event_time, event_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.datetime.fromisoformat(event_time), int(event_id)
+
+def get_page_limit():
+    limit = request.args.get('limit', DETAILS_PAGE_SIZE, type=int)
+    return max(1, min(limit, DETAILS_MAX_PAGE_SIZE))
+
+def get_event_page(event_type, tracking, cursor=None, limit=DETAILS_PAGE_SIZE):
+    model, time_column, serialize, _ = EVENT_TYPES[event_type]
+
+    # Keyset pagination on (time, id), newest first; served by the (email_tracking_id, time) index
+    query = model.query.filter(events_of(model, tracking))
+    if cursor:
+        cursor_time, cursor_id = decode_event_cursor(cursor)
+        query = query.filter(or_(time_column < cursor_time, and_(time_column == cursor_time, model.id < cursor_id)))
+
+    events = query.order_by(time_column.desc(), model.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(events) > limit:
+        events = events[:limit]
+        last = events[-1]
+        next_cursor = encode_event_cursor(getattr(last, time_column.key), last.id)
+
+    return [serialize(e) for e in events], next_cursor
+
+def get_event_summary(event_type, tracking):
+    model, time_column, _, _ = EVENT_TYPES[event_type]
+
+    total, unique_ips, first_seen, last_seen = db.session.query(
+        func.count(model.id),
+        func.count(func.distinct(model.ip_address)),
+        func.min(time_column),
+        func.max(time_column)
+    ).filter(events_of(model, tracking)).one()
+
+    day = func.date(time_column)
+    per_day = db.session.query(day, func.count(model.id)).filter(
+        events_of(model, tracking)
+    ).group_by(day).order_by(day).all()
+
+    return {
+        'total': total,
+        'unique_ips': unique_ips,
+        'first_seen': to_egypt_dict_time(first_seen),
+        'last_seen': to_egypt_dict_time(last_seen),
+        'per_day': [{'date': str(d), 'count': count} for d, count in per_day]
+    }
 
-    open_events = OpenEvent.query.filter_by(tracking_id=tracking_id).order_by(OpenEvent.open_time.desc()).all()
-    click_events = ClickEvent.query.filter_by(tracking_id=tracking_id).order_by(ClickEvent.click_time.desc()).all()
+@app.route('/api/tracking/<tracking_id>/details', methods=['GET'])
+@login_required
+@read_replica
+def get_tracking_details(tracking_id):
+    tracking, error = get_accessible_tracking(tracking_id)
+    if error:
+        return error
 
-    opens = [{'open_time': to_egypt_dict_time(e.open_time), 'ip': e.ip_address or 'Unknown', 'port': e.port or 'Unknown'} for e in open_events]
-    clicks = [{'click_time': to_egypt_dict_time(e.click_time), 'ip': e.ip_address or 'Unknown', 'port': e.port or 'Unknown'} for e in click_events]
+    limit = get_page_limit()
+    opens, opens_next_cursor = get_event_page('opens', tracking, limit=limit)
+    clicks, clicks_next_cursor = get_event_page('clicks', tracking, limit=limit)
 
     return jsonify({
         'success': True,
         'tracking': tracking.to_dict(),
+        'summary': {
+            'opens': get_event_summary('opens', tracking),
+            'clicks': get_event_summary('clicks', tracking)
+        },
         'opens': opens,
-        'clicks': clicks
+        'opens_next_cursor': opens_next_cursor,
+        'clicks': clicks,
+        'clicks_next_cursor': clicks_next_cursor,
+        'limit': limit
     })
 
-# ============ PUBLIC TRACKING (No auth needed) ============
+@app.route('/api/tracking/<tracking_id>/<any(opens, clicks):event_type>', methods=['GET'])
+@login_required
+@read_replica
+def get_tracking_events(tracking_id, event_type):
+    tracking, error = get_accessible_tracking(tracking_id)
+    if error:
+        return error
 
-@app.route('/click/<tracking_id>')
-def track_click(tracking_id):
     try:
-        tracking = EmailTracking.query.filter_by(tracking_id=tracking_id).first()
+        events, next_cursor = get_event_page(event_type, tracking, request.args.get('cursor'), get_page_limit())
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid cursor'}), 400
 
-        if tracking:
-            client_ip = get_client_ip()
-            client_port = get_client_port()
+    response = {'success': True, 'next_cursor': next_cursor}
+    if wants_columnar():
+        response.update(to_columnar(events, EVENT_TYPES[event_type][3]))
+    else:
+        response['events'] = events
 
-            click_event = ClickEvent(
-                tracking_id=tracking_id,
-                click_time=get_egypt_time().replace(tzinfo=None),
-                ip_address=client_ip,
-                port=client_port,
-                user_agent=request.headers.get('User-Agent', '')[:500]
-            )
-            db.session.add(click_event)
+    return jsonify(response)
 
-            tracking.click_count = (tracking.click_count or 0) + 1
-            tracking.last_click_time = get_egypt_time().replace(tzinfo=None)
-            tracking.last_ip = client_ip
-            tracking.last_port = client_port
+# ============ PUBLIC TRACKING (No auth needed) ============
 
-            db.session.commit()
+@app.route('/click/<tracking_id>')
+def track_click(tracking_id):
+    try:
+        client_ip = get_client_ip()
+        keys = None
+        # Over-limit clicks are still redirected, just not recorded
+        if tracking_rate_limiter.allow_client('click', request.remote_addr):
+            keys = resolve_tracking_id(tracking_id)
+
+        if keys and tracking_rate_limiter.allow_tracking('click', keys[0]):
+            email_tracking_id, user_id = keys
+            client_port = get_client_port()
+            now = get_egypt_time().replace(tzinfo=None)
+
+            # Counters are bumped in SQL by primary key; no row is loaded. Matching the
+            # token as well means a cached id whose row was deleted and reused is ignored.
+            updated = EmailTracking.query.filter_by(id=email_tracking_id, tracking_id=tracking_id).update({
+                EmailTracking.click_count: func.coalesce(EmailTracking.click_count, 0) + 1,
+                EmailTracking.last_click_time: now,
+                EmailTracking.last_ip: client_ip,
+                EmailTracking.last_port: client_port,
+                EmailTracking.updated_at: datetime.datetime.utcnow()
+            }, synchronize_session=False)
+
+            if updated:
+                click_event = ClickEvent(
+                    email_tracking_id=email_tracking_id,
+                    tracking_id=tracking_id,
+                    click_time=now,
+                    ip_address=client_ip,
+                    port=client_port,
+                    user_agent=request.headers.get('User-Agent', '')[:500]
+                )
+                db.session.add(click_event)
+                # Last before the commit (autoflush has inserted the event by then), so a
+                # sender's row is only locked briefly however many of their emails are opened
+                User.query.filter_by(id=user_id).update({
+                    User.total_clicks: User.total_clicks + 1,
+                    User.last_activity: now
+                }, synchronize_session=False)
+                db.session.commit()
+            else:
+                # Tracking row was deleted (or its id reused) since it was cached
+                tracking_id_cache.discard(tracking_id)
+                db.session.rollback()
 
         redirect_url = request.args.get('redirect', 'https://www.google.com')
         return redirect(redirect_url)
@@ -594,25 +1066,42 @@ def track_click(tracking_id):
 @app.route('/track/<tracking_id>.gif')
 def track_pixel(tracking_id):
     try:
-        tracking = EmailTracking.query.filter_by(tracking_id=tracking_id).first()
+        client_ip = get_client_ip()
+        keys = None
+        if tracking_rate_limiter.allow_client('open', request.remote_addr):
+            keys = resolve_tracking_id(tracking_id)
 
-        if tracking:
-            client_ip = get_client_ip()
+        if keys and tracking_rate_limiter.allow_tracking('open', keys[0]):
+            email_tracking_id, user_id = keys
             client_port = get_client_port()
+            now = get_egypt_time().replace(tzinfo=None)
 
-            open_event = OpenEvent(
-                tracking_id=tracking_id,
-                open_time=get_egypt_time().replace(tzinfo=None),
-                ip_address=client_ip,
-                port=client_port,
-                user_agent=request.headers.get('User-Agent', '')[:500]
-            )
-            db.session.add(open_event)
+            updated = EmailTracking.query.filter_by(id=email_tracking_id, tracking_id=tracking_id).update({
+                EmailTracking.open_count: func.coalesce(EmailTracking.open_count, 0) + 1,
+                EmailTracking.last_open_time: now,
+                EmailTracking.updated_at: datetime.datetime.utcnow()
+            }, synchronize_session=False)
 
-            tracking.open_count = (tracking.open_count or 0) + 1
-            tracking.last_open_time = get_egypt_time().replace(tzinfo=None)
-
-            db.session.commit()
+            if updated:
+                open_event = OpenEvent(
+                    email_tracking_id=email_tracking_id,
+                    tracking_id=tracking_id,
+                    open_time=now,
+                    ip_address=client_ip,
+                    port=client_port,
+                    user_agent=request.headers.get('User-Agent', '')[:500]
+                )
+                db.session.add(open_event)
+                # Last before the commit (autoflush has inserted the event by then), so a
+                # sender's row is only locked briefly however many of their emails are opened
+                User.query.filter_by(id=user_id).update({
+                    User.total_opens: User.total_opens + 1,
+                    User.last_activity: now
+                }, synchronize_session=False)
+                db.session.commit()
+            else:
+                tracking_id_cache.discard(tracking_id)
+                db.session.rollback()
 
         gif_data = base64.b64decode('R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
         response = make_response(gif_data)
@@ -705,6 +1194,14 @@ def admin():
         return redirect(url_for('dashboard'))
     return render_template('admin.html')
 
+@app.route('/api/admin/rate-limits', methods=['GET'])
+@login_required
+def get_rate_limit_stats():
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+
+    return jsonify({'success': True, **tracking_rate_limiter.stats()})
+
 @app.route('/api/admin/clear-database', methods=['POST'])
 @login_required
 def clear_database():
@@ -722,7 +1219,10 @@ def clear_database():
             conn.execute(text("DELETE FROM click_events"))
             conn.execute(text("DELETE FROM open_events"))
             conn.execute(text("DELETE FROM email_tracking"))
+            conn.execute(text("UPDATE users SET tracking_count = 0, total_opens = 0, total_clicks = 0, "
+                              "last_activity = NULL"))
             conn.commit()
+        tracking_id_cache.clear()
 
         return jsonify({
             'success': True,
@@ -739,8 +1239,15 @@ def clear_database():
 
 def create_tables():
     with app.app_context():
+        fresh = not inspect(db.engine).has_table('email_tracking')
         db.create_all()
         print("Database tables created successfully!")
+        if fresh:
+            # create_all already built the latest schema
+            migrations.stamp(db.engine)
+        else:
+            # Only quick DDL here; backfills and contract steps run via migrate_db.py
+            migrations.upgrade(db.engine, phases=(migrations.PHASE_STARTUP,))
 
 if __name__ == '__main__':
     create_tables()
@@ -0,0 +1,179 @@
+import itertools
+import math
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request, session
+from flask_login import current_user
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+
+ROUTE_PRIMARY = 'primary'
+ROUTE_REPLICA = 'replica'
+
+# Flask session key holding the time until which this user's reads stay on the primary
+PRIMARY_UNTIL_KEY = 'db_primary_until'
+
+
+def replica_connect_args(url, timeout):
+    """Driver options that bound how long connecting to a replica can take."""
+    backend = make_url(url).get_backend_name()
+    if backend == 'mysql':
+        # mysqlclient only accepts whole seconds
+        return {'connect_timeout': max(1, math.ceil(timeout))}
+    if backend == 'postgresql':
+        # libpq only takes whole seconds (and treats anything below 2 as 2)
+        return {'connect_timeout': max(2, math.ceil(timeout))}
+    return {}
+
+
+class ReplicaPool:
+    """Round-robin over replica engines, skipping any that lag too far behind.
+
+    Lag is measured on a background thread; requests only read the last
+    result, so an unreachable replica never holds up a page.
+    """
+
+    def __init__(self, urls, max_lag, check_interval, connect_timeout=2):
+        self.engines = [
+            create_engine(url, pool_pre_ping=True, connect_args=replica_connect_args(url, connect_timeout))
+            for url in urls
+        ]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        # A result older than this means the prober is stuck; don't trust it
+        self.stale_after = 2 * check_interval + connect_timeout * len(self.engines)
+        self._lag = {}
+        self._cycle = itertools.cycle(range(len(self.engines)))
+        self._lock = threading.Lock()
+        self._prober = None
+
+    def measure_lag(self, engine):
+        """Seconds the replica is behind, or None when it is unreachable or not replicating."""
+        try:
+            with engine.connect() as conn:
+                dialect = engine.dialect.name
+                if dialect == 'mysql':
+                    try:
+                        row = conn.execute(text('SHOW REPLICA STATUS')).mappings().first()
+                    except Exception:
+                        row = conn.execute(text('SHOW SLAVE STATUS')).mappings().first()
+                    if row is None:
+                        # Not configured as a replica (e.g. a local stand-in)
+                        return 0
+                    lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+                    return None if lag is None else float(lag)
+                if dialect == 'postgresql':
+                    # An idle primary makes the replay timestamp look stale, so only
+                    # count time while there is WAL left to replay.
+                    lag = conn.execute(text(
+                        'SELECT CASE WHEN NOT pg_is_in_recovery() '
+                        'OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                        'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+                    )).scalar()
+                    return float(lag or 0)
+                conn.execute(text('SELECT 1'))
+                return 0
+        except Exception as e:
+            print(f"Replica lag check failed: {e}")
+            return None
+
+    def _ensure_prober(self):
+        # Started lazily so forked workers each get their own thread
+        with self._lock:
+            if self._prober is None or not self._prober.is_alive():
+                self._prober = threading.Thread(target=self._probe_forever, name='replica-lag-probe', daemon=True)
+                self._prober.start()
+
+    def _probe_forever(self):
+        while True:
+            for index, engine in enumerate(self.engines):
+                lag = self.measure_lag(engine)
+                with self._lock:
+                    self._lag[index] = (time.monotonic(), lag)
+            time.sleep(self.check_interval)
+
+    def lag(self, index):
+        """Last measured lag, or None while unknown, unreachable or stale."""
+        self._ensure_prober()
+        with self._lock:
+            cached = self._lag.get(index)
+        if cached is None or time.monotonic() - cached[0] > self.stale_after:
+            return None
+        return cached[1]
+
+    def choose(self):
+        for _ in range(len(self.engines)):
+            with self._lock:
+                index = next(self._cycle)
+            lag = self.lag(index)
+            if lag is not None and lag <= self.max_lag:
+                return self.engines[index]
+        return None
+
+
+class RoutingSession(Session):
+    """Sends reads from replica-routed requests to a replica; everything else to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, 'is_dml', False) and _wants_replica():
+            engine = _choose_replica()
+            if engine is not None:
+                g.db_route_used = ROUTE_REPLICA
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _wants_replica():
+    return has_request_context() and g.get('db_route') == ROUTE_REPLICA
+
+
+def _choose_replica():
+    if 'db_replica_engine' not in g:
+        pool = current_app.extensions.get('replica_pool')
+        # Decide once per request so a single response never mixes replicas
+        g.db_replica_engine = pool.choose() if pool else None
+    return g.db_replica_engine
+
+
+def resolve_route():
+    override = (request.headers.get('X-DB-Route') or request.args.get('db_route') or '').lower()
+    if override in (ROUTE_PRIMARY, ROUTE_REPLICA):
+        return override
+
+    # Read-your-writes: a user who just changed something keeps reading from the primary
+    if session.get(PRIMARY_UNTIL_KEY, 0) > time.time():
+        return ROUTE_PRIMARY
+
+    return ROUTE_REPLICA
+
+
+def read_replica(view):
+    """Mark a read-only view as safe to serve from a replica."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        g.db_route = resolve_route()
+        g.db_route_used = ROUTE_PRIMARY
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def init_replicas(app):
+    urls = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+    app.extensions['replica_pool'] = ReplicaPool(
+        urls,
+        max_lag=app.config.get('REPLICA_MAX_LAG_SECONDS', 5),
+        check_interval=app.config.get('REPLICA_LAG_CHECK_INTERVAL', 2),
+        connect_timeout=app.config.get('REPLICA_CONNECT_TIMEOUT', 2)
+    ) if urls else None
+
+    @app.after_request
+    def record_route(response):
+        if 'db_route' in g:
+            response.headers['X-DB-Route'] = g.get('db_route_used', ROUTE_PRIMARY)
+        # Public tracking hits are GETs, so only logged-in users' own changes pin them
+        if request.method != 'GET' and current_user.is_authenticated:
+            session[PRIMARY_UNTIL_KEY] = time.time() + app.config.get('READ_YOUR_WRITES_SECONDS', 10)
+        return response
@@ -67,6 +67,109 @@ async function apiRequest(url, options = {}) {
     }
 }
 
+// Read a newline-delimited JSON response as it arrives: onHeader gets the
+// first line, onRows gets each following batch of lines as parsed values.
+async function streamNdjson(url, onHeader, onRows) {
+    const response = await fetch(url);
+    if (!response.ok) {
+        throw new Error(`Request failed (${response.status})`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let headerSeen = false;
+
+    const handleLines = lines => {
+        const values = lines.filter(line => line).map(line => JSON.parse(line));
+        if (!headerSeen && values.length > 0) {
+            headerSeen = true;
+            onHeader(values.shift());
+        }
+        if (values.length > 0) onRows(values);
+    };
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        handleLines(lines);
+    }
+    handleLines([buffer + decoder.decode()]);
+}
+
+// Tracking details: event lists arrive one page at a time and further pages
+// are fetched by cursor, so the modal stays small for heavily-opened emails.
+function renderDetailsEventRow(kind, event, options = {}) {
+    const time = kind === 'opens' ? event.open_time : event.click_time;
+    const latestBadge = options.latest
+        ? `<span class="badge ${kind === 'opens' ? 'bg-success' : 'bg-primary'} ms-2">Latest</span>`
+        : '';
+
+    return `
+        <tr class="${options.latest ? (kind === 'opens' ? 'table-success' : 'table-primary') : ''}">
+            <td>${formatDate(time)} ${latestBadge}</td>
+            <td><code>${escapeHtml(event.ip)}</code></td>
+            <td><code>${escapeHtml(event.port)}</code></td>
+            ${kind === 'opens' ? `<td>${escapeHtml(event.location || 'Unknown')}</td>` : ''}
+        </tr>
+    `;
+}
+
+function renderLoadMoreButton(kind, trackingId, cursor) {
+    if (!cursor) return '';
+
+    return `
+        <button type="button" class="btn btn-sm btn-outline-secondary mb-3" id="${kind}LoadMore"
+                data-cursor="${cursor}" onclick="loadMoreEvents('${kind}', '${trackingId}')">
+            Load more
+        </button>
+    `;
+}
+
+function renderEventSummary(summary) {
+    if (!summary || summary.total === 0) return '';
+
+    const recentDays = summary.per_day.slice(-14).map(d =>
+        `<span class="badge bg-light text-dark me-1">${d.date}: ${d.count}</span>`
+    ).join('');
+
+    return `
+        <p class="mt-3 mb-2 small text-muted">
+            ${summary.unique_ips} unique IPs &middot;
+            first ${formatDate(summary.first_seen)} &middot;
+            last ${formatDate(summary.last_seen)}
+        </p>
+        <div class="mb-2">${recentDays}</div>
+    `;
+}
+
+async function loadMoreEvents(kind, trackingId) {
+    const button = document.getElementById(`${kind}LoadMore`);
+    const tbody = document.getElementById(`${kind}DetailsBody`);
+    button.disabled = true;
+
+    try {
+        const params = new URLSearchParams({ cursor: button.dataset.cursor });
+        const data = await apiRequest(`/api/tracking/${trackingId}/${kind}?${params}`);
+
+        tbody.insertAdjacentHTML('beforeend', data.events.map(e => renderDetailsEventRow(kind, e)).join(''));
+
+        if (data.next_cursor) {
+            button.dataset.cursor = data.next_cursor;
+            button.disabled = false;
+        } else {
+            button.remove();
+        }
+    } catch (error) {
+        button.disabled = false;
+        showToast('Error loading events: ' + error.message, 'danger');
+    }
+}
+
 // Initialize app
 document.addEventListener('DOMContentLoaded', function() {
     console.log('Simple Email Tracker loaded');
@@ -0,0 +1,143 @@
+// Virtualized table body for columnar data ({columns, rows}).
+// Only the rows inside the scroll viewport (plus a small overscan) exist in the
+// DOM; spacer rows stand in for the rest. Row elements are reused as you scroll
+// and on refresh, and a cell is only rewritten when its rendered HTML changes.
+class VirtualTable {
+    constructor(scrollContainer, tbody, cells, options = {}) {
+        this.container = scrollContainer;
+        this.tbody = tbody;
+        this.cells = cells;
+        this.rowHeight = options.rowHeight || 48;
+        this.overscan = options.overscan || 8;
+        this.emptyHtml = options.emptyHtml || '';
+
+        this.columns = {};
+        this.rows = [];
+        this.pool = [];
+        this.framePending = false;
+
+        this.tbody.innerHTML = '';
+        this.topSpacer = this.createSpacer();
+        this.bottomSpacer = this.createSpacer();
+        this.emptyRow = document.createElement('tr');
+        this.tbody.append(this.topSpacer, this.bottomSpacer);
+
+        this.container.addEventListener('scroll', () => this.scheduleRender());
+        window.addEventListener('resize', () => this.scheduleRender());
+    }
+
+    createSpacer() {
+        const tr = document.createElement('tr');
+        const td = document.createElement('td');
+        td.colSpan = this.cells.length;
+        td.style.padding = '0';
+        td.style.border = '0';
+        tr.appendChild(td);
+        return tr;
+    }
+
+    setColumns(columns) {
+        this.columns = Object.fromEntries(columns.map((name, index) => [name, index]));
+    }
+
+    setRows(rows) {
+        this.rows = rows;
+        this.scheduleRender();
+    }
+
+    // Merge changed rows in by key: known rows are replaced where they are, unknown
+    // ones newer than anything loaded go on top of the newest-first list, and unknown
+    // ones older than the last loaded row belong to a part of the list not loaded yet.
+    // Returns how many rows were added.
+    upsertRows(changed, key = 'id') {
+        const keyIndex = this.columns[key];
+        const positions = new Map(this.rows.map((row, index) => [row[keyIndex], index]));
+        const oldest = this.rows.length > 0 ? this.rows[this.rows.length - 1][keyIndex] : -Infinity;
+        const added = [];
+
+        changed.forEach(row => {
+            const index = positions.get(row[keyIndex]);
+            if (index !== undefined) {
+                this.rows[index] = row;
+            } else if (row[keyIndex] > oldest) {
+                added.push(row);
+            }
+        });
+
+        if (added.length > 0) {
+            added.sort((a, b) => b[keyIndex] - a[keyIndex]);
+            this.rows = added.concat(this.rows);
+            // Keep the rows being looked at in place when scrolled down
+            if (this.container.scrollTop > 0) this.container.scrollTop += added.length * this.rowHeight;
+        }
+        this.scheduleRender();
+        return added.length;
+    }
+
+    // Accessor handed to cell renderers: value('open_count') for the current row
+    valueGetter(row) {
+        return name => row[this.columns[name]];
+    }
+
+    scheduleRender() {
+        if (this.framePending) return;
+        this.framePending = true;
+        requestAnimationFrame(() => {
+            this.framePending = false;
+            this.render();
+        });
+    }
+
+    render() {
+        const total = this.rows.length;
+
+        if (total === 0) {
+            this.pool.forEach(tr => tr.remove());
+            this.pool = [];
+            this.topSpacer.firstChild.style.height = '0px';
+            this.bottomSpacer.firstChild.style.height = '0px';
+            this.emptyRow.innerHTML = this.emptyHtml;
+            if (!this.emptyRow.parentNode) this.tbody.insertBefore(this.emptyRow, this.bottomSpacer);
+            return;
+        }
+        this.emptyRow.remove();
+
+        // Position of the table body inside the scroll container
+        const offset = this.tbody.offsetTop;
+        const scrollTop = Math.max(0, this.container.scrollTop - offset);
+        const viewport = this.container.clientHeight || window.innerHeight;
+
+        const first = Math.max(0, Math.floor(scrollTop / this.rowHeight) - this.overscan);
+        const count = Math.min(total - first, Math.ceil(viewport / this.rowHeight) + 2 * this.overscan);
+
+        this.topSpacer.firstChild.style.height = `${first * this.rowHeight}px`;
+        this.bottomSpacer.firstChild.style.height = `${(total - first - count) * this.rowHeight}px`;
+
+        while (this.pool.length < count) {
+            const tr = document.createElement('tr');
+            tr.style.height = `${this.rowHeight}px`;
+            this.cells.forEach(() => tr.appendChild(document.createElement('td')));
+            this.tbody.insertBefore(tr, this.bottomSpacer);
+            this.pool.push(tr);
+        }
+        while (this.pool.length > count) {
+            this.pool.pop().remove();
+        }
+
+        for (let i = 0; i < count; i++) {
+            this.updateRow(this.pool[i], this.rows[first + i]);
+        }
+    }
+
+    updateRow(tr, row) {
+        const value = this.valueGetter(row);
+        this.cells.forEach((renderCell, index) => {
+            const td = tr.children[index];
+            const html = renderCell(value);
+            if (td.dataset.html !== html) {
+                td.innerHTML = html;
+                td.dataset.html = html;
+            }
+        });
+    }
+}
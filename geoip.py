@@ -0,0 +1,49 @@
+import functools
+
+try:
+    import maxminddb
+except ImportError:  # only the enrichment worker needs it
+    maxminddb = None
+
+
+class GeoIPResolver:
+    """Looks up IPs in a local MaxMind-format (.mmdb) database.
+
+    The file is memory-mapped, so lookups read straight from the page cache, and
+    recent answers are kept in an LRU because the same proxies re-fetch pixels
+    over and over.
+    """
+
+    def __init__(self, db_path, cache_size=10000):
+        if maxminddb is None:
+            raise RuntimeError('GeoIP enrichment requires the maxminddb package (pip install maxminddb)')
+        self.reader = maxminddb.open_database(db_path, maxminddb.MODE_MMAP)
+        self.lookup = functools.lru_cache(maxsize=cache_size)(self._lookup)
+
+    def _lookup(self, ip):
+        """Return ``(latitude, longitude, location)`` for an IP, or None if unknown."""
+        if not ip:
+            return None
+        try:
+            record = self.reader.get(ip)
+        except ValueError:
+            # Not a valid IP address (e.g. a garbled X-Forwarded-For value)
+            return None
+        if not record:
+            return None
+
+        coordinates = record.get('location') or {}
+        latitude = coordinates.get('latitude')
+        longitude = coordinates.get('longitude')
+
+        city = (record.get('city') or {}).get('names', {}).get('en')
+        country = (record.get('country') or {}).get('names', {}).get('en')
+        location = ', '.join(part for part in (city, country) if part) or None
+
+        if latitude is None and longitude is None and location is None:
+            return None
+        return latitude, longitude, location[:255] if location else None
+
+    def close(self):
+        self.lookup.cache_clear()
+        self.reader.close()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import os
+import sys
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from sqlalchemy import func
+
+from app import app, db, event_keys_backfilled, EmailTracking, OpenEvent
+from geoip import GeoIPResolver
+
+GEOIP_DATABASE_PATH = os.getenv('GEOIP_DATABASE_PATH', 'data/GeoLite2-City.mmdb')
+GEOIP_CACHE_SIZE = int(os.getenv('GEOIP_CACHE_SIZE', '10000'))
+GEOIP_BATCH_SIZE = int(os.getenv('GEOIP_BATCH_SIZE', '1000'))
+GEOIP_POLL_INTERVAL = float(os.getenv('GEOIP_POLL_INTERVAL', '10'))
+
+
+def enrich_batch(resolver, batch_size=GEOIP_BATCH_SIZE):
+    """Resolve one batch of unchecked open events and write the results in bulk.
+
+    Returns the number of events processed.
+    """
+    if event_keys_backfilled():
+        tracking_join = EmailTracking.id == OpenEvent.email_tracking_id
+    else:
+        # Events written before the integer key was backfilled
+        tracking_join = EmailTracking.tracking_id == OpenEvent.tracking_id
+
+    rows = (
+        db.session.query(OpenEvent.id, OpenEvent.ip_address, OpenEvent.open_time, EmailTracking.id)
+        .join(EmailTracking, tracking_join)
+        .filter(OpenEvent.geo_checked_at.is_(None))
+        .order_by(OpenEvent.id)
+        .limit(batch_size)
+        .all()
+    )
+    if not rows:
+        return 0
+
+    checked_at = datetime.datetime.utcnow()
+    event_updates = []
+    latest_by_tracking = {}
+
+    for event_id, ip_address, open_time, email_tracking_id in rows:
+        update = {'id': event_id, 'geo_checked_at': checked_at}
+        result = resolver.lookup(ip_address)
+        if result:
+            latitude, longitude, location = result
+            update.update(latitude=latitude, longitude=longitude, location=location)
+        event_updates.append(update)
+
+        latest = latest_by_tracking.get(email_tracking_id)
+        if latest is None or open_time >= latest[0]:
+            latest_by_tracking[email_tracking_id] = (open_time, result or (None, None, None))
+
+    # last_location belongs with last_open_time: only the newest open of each email
+    # sets it, and an unresolved newest open clears an older location
+    newest_open = dict(
+        db.session.query(EmailTracking.id, func.max(OpenEvent.open_time))
+        .join(OpenEvent, tracking_join)
+        .filter(EmailTracking.id.in_(list(latest_by_tracking)))
+        .group_by(EmailTracking.id)
+        .all()
+    )
+    tracking_updates = [
+        {'id': email_tracking_id, 'last_latitude': latitude, 'last_longitude': longitude, 'last_location': location,
+         'updated_at': checked_at}
+        for email_tracking_id, (open_time, (latitude, longitude, location)) in latest_by_tracking.items()
+        if open_time >= newest_open[email_tracking_id]
+    ]
+
+    db.session.bulk_update_mappings(OpenEvent, event_updates)
+    if tracking_updates:
+        db.session.bulk_update_mappings(EmailTracking, tracking_updates)
+    db.session.commit()
+
+    return len(rows)
+
+
+def wait_for_database(once, interval):
+    """Wait for the .mmdb file instead of crash-looping under a restart policy."""
+    if os.path.exists(GEOIP_DATABASE_PATH):
+        return True
+
+    print(f"⚠️  GeoIP database not found at {GEOIP_DATABASE_PATH}. Download GeoLite2-City.mmdb "
+          "(see README) or set GEOIP_DATABASE_PATH; open events are left unenriched until then.")
+    if once:
+        return False
+    while not os.path.exists(GEOIP_DATABASE_PATH):
+        time.sleep(interval)
+    return True
+
+
+def run_worker(once=False, batch_size=GEOIP_BATCH_SIZE, interval=GEOIP_POLL_INTERVAL):
+    if not wait_for_database(once, interval):
+        return False
+
+    resolver = GeoIPResolver(GEOIP_DATABASE_PATH, cache_size=GEOIP_CACHE_SIZE)
+    print(f"🌍 GeoIP worker started with {GEOIP_DATABASE_PATH}")
+
+    try:
+        with app.app_context():
+            while True:
+                try:
+                    processed = enrich_batch(resolver, batch_size)
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"❌ GeoIP enrichment error: {e}")
+                    processed = 0
+                    if once:
+                        return False
+
+                if processed:
+                    print(f"✅ Enriched {processed} open events")
+                if once and processed < batch_size:
+                    return True
+                if processed < batch_size:
+                    time.sleep(interval)
+    finally:
+        resolver.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fill in locations for open events from a local GeoIP database')
+    parser.add_argument('--once', action='store_true', help='drain the backlog and exit')
+    parser.add_argument('--batch-size', type=int, default=GEOIP_BATCH_SIZE)
+    parser.add_argument('--interval', type=float, default=GEOIP_POLL_INTERVAL, help='seconds to wait when idle')
+    args = parser.parse_args(argv)
+
+    return run_worker(once=args.once, batch_size=args.batch_size, interval=args.interval)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
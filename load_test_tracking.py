@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Local load test for the public tracking endpoints.
+
+Hammers /track/<id>.gif in-process against a throwaway SQLite database and
+checks that the number of stored open events stays within what the rate
+limits allow, whatever the request rate. Requests look like they came
+through nginx: a client-chosen X-Forwarded-For value followed by the hop
+the proxy appends. Limits come from the usual RATE_LIMIT_* environment
+variables.
+
+    python load_test_tracking.py --duration 5
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+# Never point this at a real database
+_db_dir = tempfile.mkdtemp(prefix='tracker-load-test-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_db_dir, 'load_test.db')}"
+os.environ['REPLICA_DATABASE_URLS'] = ''
+os.environ['TRUSTED_PROXY_COUNT'] = '1'
+
+from app import app, db, create_tables, tracking_rate_limiter, EmailTracking, OpenEvent, User
+
+TRACKING_COUNT = 200
+
+
+def random_ip():
+    return '.'.join(str(random.randint(1, 254)) for _ in range(4))
+
+
+def setup_data():
+    create_tables()
+    with app.app_context():
+        user = User(username='load-test', email='load-test@example.com')
+        user.set_password(uuid.uuid4().hex)
+        db.session.add(user)
+        db.session.flush()
+
+        tokens = [uuid.uuid4().hex for _ in range(TRACKING_COUNT)]
+        db.session.add_all(
+            EmailTracking(user_id=user.id, tracking_id=token, recipient_email=f'r{i}@example.com')
+            for i, token in enumerate(tokens)
+        )
+        db.session.commit()
+    return tokens
+
+
+def stored_opens():
+    with app.app_context():
+        return OpenEvent.query.count()
+
+
+def hit_pixel(client, token, claimed_ip, proxy_ip):
+    # nginx appends the address it saw to whatever the client sent
+    return client.get(f'/track/{token}.gif', headers={'X-Forwarded-For': f'{claimed_ip}, {proxy_ip}'})
+
+
+def run_scenario(client, name, duration, next_request, cap):
+    tracking_rate_limiter.reset_counters()
+    before = stored_opens()
+    requests_sent = 0
+    started = time.monotonic()
+
+    while time.monotonic() - started < duration:
+        token, claimed_ip, proxy_ip = next_request()
+        response = hit_pixel(client, token, claimed_ip, proxy_ip)
+        if response.status_code != 200 or response.mimetype != 'image/gif':
+            print(f"❌ {name}: unexpected response {response.status_code} {response.mimetype}")
+            return False
+        requests_sent += 1
+
+    elapsed = time.monotonic() - started
+    writes = stored_opens() - before
+    counters = tracking_rate_limiter.stats()['counters'].get('open', {})
+    ok = writes <= cap
+
+    print(f"{'✅' if ok else '❌'} {name}")
+    print(f"   {requests_sent} requests ({requests_sent / elapsed:.0f}/s) -> {writes} stored "
+          f"({writes / elapsed:.1f}/s), cap {cap:.0f}")
+    print(f"   shed: {counters.get('shed_ip', 0)} by IP, {counters.get('shed_tracking', 0)} by tracking ID")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check that public tracking writes stay rate limited')
+    parser.add_argument('--duration', type=float, default=5, help='seconds per scenario')
+    args = parser.parse_args(argv)
+
+    if not tracking_rate_limiter.enabled:
+        print("❌ Rate limiting is disabled (RATE_LIMIT_ENABLED=false)")
+        return False
+
+    tokens = setup_data()
+    client = app.test_client()
+    duration = args.duration
+
+    by_ip = tracking_rate_limiter.by_ip
+    by_tracking = tracking_rate_limiter.by_tracking
+    ip_cap = by_ip.burst + by_ip.rate * duration
+    tracking_cap = by_tracking.burst + by_tracking.rate * duration
+
+    # Each scenario uses fresh keys so earlier ones do not drain its buckets
+    single_ip, single_token = random_ip(), tokens[0]
+    spoofing_ip, spoofed_token = random_ip(), tokens[1]
+    scanning_ip = random_ip()
+    scan_tokens = tokens[2:-1]
+    spared_token = tokens[-1]
+
+    scenarios = [
+        ('One client reloading one pixel',
+         lambda: (single_token, single_ip, single_ip), tracking_cap),
+        ('One client spoofing X-Forwarded-For on one pixel',
+         lambda: (spoofed_token, random_ip(), spoofing_ip), tracking_cap),
+        ('One client spoofing X-Forwarded-For across many pixels',
+         lambda: (random.choice(scan_tokens), random_ip(), scanning_ip), ip_cap),
+        ('Many clients with random tokens',
+         lambda: (uuid.uuid4().hex, random_ip(), random_ip()), 0),
+    ]
+
+    memory_before = tracking_rate_limiter.stats()['memory_bytes']
+    results = [run_scenario(client, name, duration, next_request, cap) for name, next_request, cap in scenarios]
+    memory_after = tracking_rate_limiter.stats()['memory_bytes']
+
+    # Made-up tokens must not use up the buckets of real ones
+    before = stored_opens()
+    hit_pixel(client, spared_token, random_ip(), random_ip())
+    spared = stored_opens() - before == 1
+    print(f"{'✅' if spared else '❌'} Real pixel still stored after the random-token flood")
+
+    print(f"📦 Limiter memory: {memory_after // 1024} KiB (unchanged: {memory_before == memory_after})")
+    return all(results) and spared and memory_before == memory_after
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
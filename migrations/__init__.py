@@ -0,0 +1,450 @@
+import datetime
+import importlib
+import os
+import pkgutil
+from contextlib import contextmanager
+
+from sqlalchemy import Column, ForeignKeyConstraint, MetaData, Table, inspect, text
+
+MIGRATIONS_TABLE = 'schema_migrations'
+VERSIONS_PACKAGE = 'migrations.versions'
+
+# Tables created by app.create_tables(); migrations only evolve an existing schema
+BASE_TABLES = ('users', 'email_tracking', 'open_events', 'click_events')
+
+# Give up quickly instead of queueing behind pixel traffic for a metadata lock
+LOCK_TIMEOUT_SECONDS = int(os.getenv('MIGRATION_LOCK_TIMEOUT', '5'))
+BATCH_SIZE = int(os.getenv('MIGRATION_BATCH_SIZE', '5000'))
+
+# When a migration may run:
+#   startup  - quick DDL, applied by app.create_tables() before serving
+#   online   - long backfills/index builds, run with migrate_db.py while the app serves
+#   contract - removes what the previous release still uses; migrate_db.py --contract only,
+#              once every process runs the new code
+# A migration may only depend on earlier migrations of its own or an earlier phase,
+# so a pending contract step does not hold back later startup DDL.
+PHASE_STARTUP = 'startup'
+PHASE_ONLINE = 'online'
+PHASE_CONTRACT = 'contract'
+PHASES = (PHASE_STARTUP, PHASE_ONLINE, PHASE_CONTRACT)
+
+
+class MigrationError(Exception):
+    pass
+
+
+class Migration:
+    def __init__(self, revision, description, upgrade, phase=PHASE_STARTUP, drops=()):
+        if phase not in PHASES:
+            raise MigrationError(f'Unknown phase {phase!r} for migration {revision}')
+        self.revision = revision
+        self.description = description
+        self.upgrade = upgrade
+        self.phase = phase
+        # (table, column) pairs the migration removes; see upgrade(mapped_columns=...)
+        self.drops = tuple(drops)
+
+    def __repr__(self):
+        return f'<Migration {self.revision}: {self.description}>'
+
+
+def load_migrations():
+    package = importlib.import_module(VERSIONS_PACKAGE)
+    migrations = []
+    for info in pkgutil.iter_modules(package.__path__):
+        module = importlib.import_module(f'{VERSIONS_PACKAGE}.{info.name}')
+        migrations.append(Migration(
+            module.revision, module.description, module.upgrade, getattr(module, 'phase', PHASE_STARTUP),
+            getattr(module, 'drops', ())
+        ))
+
+    migrations.sort(key=lambda m: m.revision)
+    revisions = [m.revision for m in migrations]
+    if len(revisions) != len(set(revisions)):
+        raise MigrationError(f'Duplicate migration revisions: {revisions}')
+    return migrations
+
+
+class MigrationContext:
+    """Schema operations that avoid long table locks on a live database.
+
+    Every helper checks the current schema first, so a migration that failed
+    halfway can simply be re-run.
+    """
+
+    def __init__(self, engine, batch_size=BATCH_SIZE, log=print):
+        self.engine = engine
+        self.dialect = engine.dialect.name
+        self.batch_size = batch_size
+        self.log = log
+
+    @contextmanager
+    def connection(self, autocommit=False):
+        conn = self.engine.connect()
+        if autocommit:
+            conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+        try:
+            if self.dialect == 'mysql':
+                conn.execute(text(f'SET SESSION lock_wait_timeout = {LOCK_TIMEOUT_SECONDS}'))
+            elif self.dialect == 'postgresql':
+                conn.execute(text(f"SET lock_timeout = '{LOCK_TIMEOUT_SECONDS}s'"))
+            yield conn
+            if not autocommit:
+                conn.commit()
+        except Exception:
+            if not autocommit:
+                conn.rollback()
+            raise
+        finally:
+            try:
+                if self.dialect == 'mysql':
+                    conn.execute(text('SET SESSION lock_wait_timeout = DEFAULT'))
+                elif self.dialect == 'postgresql':
+                    conn.execute(text('RESET lock_timeout'))
+            finally:
+                conn.close()
+
+    def execute(self, sql, params=None):
+        with self.connection() as conn:
+            return conn.execute(text(sql), params or {})
+
+    # ---- introspection ----
+
+    def has_table(self, table):
+        return inspect(self.engine).has_table(table)
+
+    def has_column(self, table, column):
+        return any(c['name'] == column for c in inspect(self.engine).get_columns(table))
+
+    def has_index(self, table, name):
+        return any(i['name'] == name for i in inspect(self.engine).get_indexes(table))
+
+    def is_nullable(self, table, column):
+        return next(c['nullable'] for c in inspect(self.engine).get_columns(table) if c['name'] == column)
+
+    def foreign_keys_on(self, table, column):
+        return [fk for fk in inspect(self.engine).get_foreign_keys(table) if column in fk['constrained_columns']]
+
+    def indexes_on(self, table, column):
+        return [i['name'] for i in inspect(self.engine).get_indexes(table) if column in i['column_names']]
+
+    # ---- online DDL ----
+
+    def add_column(self, table, column, ddl_type):
+        if self.has_column(table, column):
+            self.log(f'⚠️  {table}.{column} already exists')
+            return False
+
+        sql = f'ALTER TABLE {table} ADD COLUMN {column} {ddl_type}'
+        if self.dialect == 'mysql':
+            # INSTANT only touches the data dictionary (MySQL 8.0.12+); older
+            # servers fall back to an in-place rebuild that still allows writes.
+            try:
+                self.execute(f'{sql}, ALGORITHM=INSTANT')
+            except Exception:
+                self.execute(f'{sql}, ALGORITHM=INPLACE, LOCK=NONE')
+        else:
+            # Nullable columns without a default are metadata-only on PostgreSQL and SQLite
+            self.execute(sql)
+
+        self.log(f'✅ Added {table}.{column}')
+        return True
+
+    def create_index(self, name, table, columns, unique=False):
+        if self.has_index(table, name):
+            if self.dialect != 'postgresql' or self._pg_index_is_valid(name):
+                self.log(f'⚠️  Index {name} already exists')
+                return False
+            # A failed CREATE INDEX CONCURRENTLY leaves an INVALID index behind
+            self.drop_index(name, table)
+
+        unique_sql = 'UNIQUE ' if unique else ''
+        column_sql = ', '.join(columns)
+        if self.dialect == 'postgresql':
+            # CONCURRENTLY cannot run inside a transaction block
+            with self.connection(autocommit=True) as conn:
+                conn.execute(text(f'CREATE {unique_sql}INDEX CONCURRENTLY {name} ON {table} ({column_sql})'))
+        elif self.dialect == 'mysql':
+            self.execute(f'CREATE {unique_sql}INDEX {name} ON {table} ({column_sql}) ALGORITHM=INPLACE LOCK=NONE')
+        else:
+            self.execute(f'CREATE {unique_sql}INDEX {name} ON {table} ({column_sql})')
+
+        self.log(f'✅ Created index {name} on {table} ({column_sql})')
+        return True
+
+    def drop_index(self, name, table):
+        if not self.has_index(table, name):
+            return False
+
+        if self.dialect == 'postgresql':
+            with self.connection(autocommit=True) as conn:
+                conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
+        elif self.dialect == 'mysql':
+            self.execute(f'DROP INDEX {name} ON {table} ALGORITHM=INPLACE LOCK=NONE')
+        else:
+            self.execute(f'DROP INDEX {name}')
+
+        self.log(f'✅ Dropped index {name}')
+        return True
+
+    def add_foreign_key(self, name, table, column, ref_table, ref_column):
+        if self.foreign_keys_on(table, column):
+            self.log(f'⚠️  Foreign key on {table}.{column} already exists')
+            return False
+
+        sql = f'ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY ({column}) REFERENCES {ref_table} ({ref_column})'
+        if self.dialect == 'mysql':
+            # In-place FK creation is only allowed with checks off; the data was
+            # just backfilled from the parent table, so it is already consistent.
+            with self.connection() as conn:
+                conn.execute(text('SET SESSION foreign_key_checks = 0'))
+                try:
+                    conn.execute(text(f'{sql}, ALGORITHM=INPLACE, LOCK=NONE'))
+                finally:
+                    conn.execute(text('SET SESSION foreign_key_checks = 1'))
+        elif self.dialect == 'postgresql':
+            # NOT VALID skips the scan under the exclusive lock; VALIDATE then
+            # checks existing rows while allowing writes.
+            self.execute(f'{sql} NOT VALID')
+            self.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {name}')
+        else:
+            # SQLite can only add a constraint with the column itself (add_column(..., 'INTEGER REFERENCES ...'))
+            self.log(f'⚠️  Cannot add a foreign key to existing {table} on {self.dialect}; skipped')
+            return False
+
+        self.log(f'✅ Added foreign key {name} on {table}.{column}')
+        return True
+
+    def set_not_null(self, table, column, ddl_type):
+        if not self.is_nullable(table, column):
+            self.log(f'⚠️  {table}.{column} is already NOT NULL')
+            return False
+
+        if self.dialect == 'mysql':
+            self.execute(f'ALTER TABLE {table} MODIFY COLUMN {column} {ddl_type} NOT NULL, ALGORITHM=INPLACE, LOCK=NONE')
+        elif self.dialect == 'postgresql':
+            # A validated CHECK lets SET NOT NULL skip its full-table scan (PostgreSQL 12+)
+            check = f'{table}_{column}_not_null'
+            self.execute(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {check}')
+            self.execute(f'ALTER TABLE {table} ADD CONSTRAINT {check} CHECK ({column} IS NOT NULL) NOT VALID')
+            self.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {check}')
+            self.execute(f'ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL')
+            self.execute(f'ALTER TABLE {table} DROP CONSTRAINT {check}')
+        else:
+            self._rebuild_sqlite_table(table, not_null_columns=(column,))
+
+        self.log(f'✅ Set {table}.{column} NOT NULL')
+        return True
+
+    def drop_column(self, table, column):
+        if not self.has_column(table, column):
+            self.log(f'⚠️  {table}.{column} already dropped')
+            return False
+
+        if self.dialect == 'sqlite':
+            # SQLite refuses to drop indexed or constrained columns
+            self._rebuild_sqlite_table(table, drop_columns=(column,))
+        else:
+            if self.dialect == 'mysql':
+                # The FK owns an index on the column, so it has to go first
+                for fk in self.foreign_keys_on(table, column):
+                    self.execute(f'ALTER TABLE {table} DROP FOREIGN KEY {fk["name"]}, ALGORITHM=INPLACE, LOCK=NONE')
+            # Drop composite indexes explicitly; MySQL would otherwise keep them
+            # with the remaining columns only.
+            for name in self.indexes_on(table, column):
+                self.drop_index(name, table)
+            if self.dialect == 'mysql':
+                self.execute(f'ALTER TABLE {table} DROP COLUMN {column}, ALGORITHM=INPLACE, LOCK=NONE')
+            else:
+                # Catalog-only on PostgreSQL; dependent constraints go with the column
+                self.execute(f'ALTER TABLE {table} DROP COLUMN {column}')
+
+        self.log(f'✅ Dropped {table}.{column}')
+        return True
+
+    def _rebuild_sqlite_table(self, table, drop_columns=(), not_null_columns=()):
+        # The usual SQLite recipe: copy into a new table with the desired shape,
+        # swap it in, then recreate the surviving indexes.
+        metadata = MetaData()
+        old = Table(table, metadata, autoload_with=self.engine)
+        rebuilt = f'_{table}_rebuild'
+
+        columns = [
+            Column(c.name, c.type, primary_key=c.primary_key, server_default=c.server_default,
+                   nullable=False if c.name in not_null_columns else c.nullable)
+            for c in old.columns if c.name not in drop_columns
+        ]
+        foreign_keys = [
+            ForeignKeyConstraint(fk.column_keys, [e.target_fullname for e in fk.elements])
+            for fk in old.foreign_key_constraints if not set(fk.column_keys) & set(drop_columns)
+        ]
+        indexes = [
+            (ix.name, [c.name for c in ix.columns], ix.unique)
+            for ix in old.indexes if not {c.name for c in ix.columns} & set(drop_columns)
+        ]
+        new = Table(rebuilt, metadata, *columns, *foreign_keys)
+        column_sql = ', '.join(c.name for c in columns)
+
+        with self.connection() as conn:
+            new.create(conn)
+            conn.execute(text(f'INSERT INTO {rebuilt} ({column_sql}) SELECT {column_sql} FROM {table}'))
+            conn.execute(text(f'DROP TABLE {table}'))
+            conn.execute(text(f'ALTER TABLE {rebuilt} RENAME TO {table}'))
+            for name, index_columns, unique in indexes:
+                conn.execute(text(f'CREATE {"UNIQUE " if unique else ""}INDEX {name} ON {table} ({", ".join(index_columns)})'))
+
+    def _pg_index_is_valid(self, name):
+        with self.connection() as conn:
+            return bool(conn.execute(text(
+                'SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid '
+                'WHERE c.relname = :name'
+            ), {'name': name}).scalar())
+
+    # ---- batched data changes ----
+
+    def backfill(self, table, assignments, where, params=None, batch_size=None):
+        """Run ``UPDATE table SET assignments WHERE where`` in primary-key batches.
+
+        Each batch commits on its own so row locks are held only briefly and
+        replication never sees one huge transaction.
+        """
+        batch_size = batch_size or self.batch_size
+        params = params or {}
+
+        with self.connection() as conn:
+            low, high = conn.execute(
+                text(f'SELECT MIN(id), MAX(id) FROM {table} WHERE {where}'), params
+            ).one()
+
+        if low is None:
+            return 0
+
+        total = 0
+        start = low
+        while start <= high:
+            with self.connection() as conn:
+                result = conn.execute(
+                    text(f'UPDATE {table} SET {assignments} WHERE id >= :batch_start AND id < :batch_end AND ({where})'),
+                    dict(params, batch_start=start, batch_end=start + batch_size)
+                )
+                total += result.rowcount
+            start += batch_size
+
+        self.log(f'✅ Backfilled {total} rows in {table}')
+        return total
+
+
+# ============ REVISION STATE ============
+
+def ensure_version_table(engine):
+    datetime_type = 'TIMESTAMP' if engine.dialect.name == 'postgresql' else 'DATETIME'
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+                revision VARCHAR(64) NOT NULL PRIMARY KEY,
+                description VARCHAR(255) NULL,
+                applied_at {datetime_type} NOT NULL
+            )
+        """))
+
+
+def applied_revisions(engine):
+    ensure_version_table(engine)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text(f'SELECT revision FROM {MIGRATIONS_TABLE}'))}
+
+
+def current_revision(engine):
+    applied = applied_revisions(engine)
+    return max(applied) if applied else None
+
+
+def pending_migrations(engine, migrations=None):
+    migrations = migrations if migrations is not None else load_migrations()
+    applied = applied_revisions(engine)
+    return [m for m in migrations if m.revision not in applied]
+
+
+def record_revision(engine, migration):
+    with engine.begin() as conn:
+        conn.execute(
+            text(f'INSERT INTO {MIGRATIONS_TABLE} (revision, description, applied_at) '
+                 'VALUES (:revision, :description, :applied_at)'),
+            {
+                'revision': migration.revision,
+                'description': migration.description[:255],
+                'applied_at': datetime.datetime.utcnow()
+            }
+        )
+
+
+def deferred_by(migration, deferred):
+    # Left pending because of its own phase, or because an earlier migration of
+    # the same or an earlier phase was
+    return any(PHASES.index(migration.phase) >= PHASES.index(d.phase) for d in deferred)
+
+
+def upgrade(engine, target=None, log=print, batch_size=BATCH_SIZE, phases=PHASES, mapped_columns=None):
+    """Apply pending migrations in order.
+
+    A migration whose phase is not in ``phases`` is left pending, and so is
+    every later one of the same or a later phase; later migrations of an
+    earlier phase still run.
+
+    ``mapped_columns`` is the set of (table, column) pairs the running code's
+    models map. A migration that drops one of them raises MigrationError
+    before anything is applied, since every write of that model would fail.
+    """
+    missing = [t for t in BASE_TABLES if not inspect(engine).has_table(t)]
+    if missing:
+        raise MigrationError(f'Missing base tables {missing}; start the app once to create them')
+
+    if mapped_columns is not None:
+        for migration in pending_migrations(engine):
+            still_mapped = sorted(set(migration.drops) & set(mapped_columns))
+            if still_mapped and migration.phase in phases and (target is None or migration.revision <= target):
+                columns = ', '.join(f'{table}.{column}' for table, column in still_mapped)
+                raise MigrationError(
+                    f'{migration.revision} drops {columns}, which the models still map; '
+                    'deploy the release that stops mapping it first'
+                )
+
+    context = MigrationContext(engine, batch_size=batch_size, log=log)
+    applied = []
+    deferred = []
+
+    for migration in pending_migrations(engine):
+        if target is not None and migration.revision > target:
+            break
+        if migration.phase not in phases or deferred_by(migration, deferred):
+            log(f'⏳ {migration.revision} ({migration.phase}) left pending: {migration.description}')
+            deferred.append(migration)
+            continue
+
+        log(f'🔄 Applying {migration.revision}: {migration.description}')
+        # DDL is not transactional on MySQL, so the revision is only recorded once
+        # every step has succeeded; the steps themselves are safe to repeat.
+        migration.upgrade(context)
+        record_revision(engine, migration)
+        applied.append(migration.revision)
+
+    return applied
+
+
+def stamp(engine, phases=(PHASE_STARTUP, PHASE_ONLINE)):
+    """Mark migrations as applied without running them.
+
+    For databases whose tables were just created from the current models:
+    older revisions describe columns those models no longer have. Contract
+    migrations are left pending, since the current models still map what
+    they remove.
+    """
+    stamped = []
+    deferred = []
+    for migration in pending_migrations(engine):
+        if migration.phase not in phases or deferred_by(migration, deferred):
+            deferred.append(migration)
+            continue
+        record_revision(engine, migration)
+        stamped.append(migration.revision)
+    return stamped
@@ -0,0 +1,15 @@
+# Replaces the old one-off migrate_db.py statements so existing deployments
+# converge on the same schema whether or not they already ran it.
+
+revision = '0001'
+description = 'Location columns on email_tracking and open_events'
+
+
+def upgrade(ctx):
+    ctx.add_column('email_tracking', 'last_latitude', 'FLOAT NULL')
+    ctx.add_column('email_tracking', 'last_longitude', 'FLOAT NULL')
+    ctx.add_column('email_tracking', 'last_location', 'VARCHAR(255) NULL')
+
+    ctx.add_column('open_events', 'latitude', 'FLOAT NULL')
+    ctx.add_column('open_events', 'longitude', 'FLOAT NULL')
+    ctx.add_column('open_events', 'location', 'VARCHAR(255) NULL')
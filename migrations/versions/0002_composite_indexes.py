@@ -0,0 +1,16 @@
+# Composite indexes for the dashboard listing (filter by user, newest first)
+# and the details view (events for one tracking_id, newest first). Building them
+# on large event tables takes a while, so this runs online rather than before
+# the app serves; the models declare them for freshly created databases.
+
+from migrations import PHASE_ONLINE
+
+revision = '0002'
+description = 'Composite indexes for tracking list and event details'
+phase = PHASE_ONLINE
+
+
+def upgrade(ctx):
+    ctx.create_index('ix_email_tracking_user_id_created_at', 'email_tracking', ['user_id', 'created_at'])
+    ctx.create_index('ix_open_events_tracking_id_open_time', 'open_events', ['tracking_id', 'open_time'])
+    ctx.create_index('ix_click_events_tracking_id_click_time', 'click_events', ['tracking_id', 'click_time'])
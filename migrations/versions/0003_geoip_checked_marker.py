@@ -0,0 +1,10 @@
+# Lets the GeoIP worker find open events it has not looked at yet. Events whose
+# IP cannot be resolved still get a timestamp, so they are not rescanned forever.
+# The index the worker scans by is built online, in 0010.
+
+revision = '0003'
+description = 'GeoIP enrichment marker on open_events'
+
+
+def upgrade(ctx):
+    ctx.add_column('open_events', 'geo_checked_at', 'DATETIME NULL' if ctx.dialect != 'postgresql' else 'TIMESTAMP NULL')
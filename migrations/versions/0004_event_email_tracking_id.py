@@ -0,0 +1,16 @@
+# Expand step for integer event keys: open_events / click_events gain a nullable
+# email_tracking_id pointing at email_tracking.id. Adding a nullable column is
+# metadata-only, so this runs at startup; filling it in is 0005.
+
+revision = '0004'
+description = 'Integer email_tracking_id on event tables (expand)'
+
+EVENT_TABLES = ('open_events', 'click_events')
+
+
+def upgrade(ctx):
+    # SQLite can only gain a foreign key together with the column
+    column_type = 'INTEGER NULL REFERENCES email_tracking (id)' if ctx.dialect == 'sqlite' else 'INTEGER NULL'
+
+    for table in EVENT_TABLES:
+        ctx.add_column(table, 'email_tracking_id', column_type)
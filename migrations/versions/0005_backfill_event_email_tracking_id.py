@@ -0,0 +1,27 @@
+# Fills email_tracking_id for events written before 0004 in primary-key
+# batches, then builds its indexes and foreign key without blocking writes.
+# The app reads events by the integer key only once this revision is recorded;
+# until then it keeps using the (tracking_id, time) indexes.
+
+from migrations import PHASE_ONLINE
+
+revision = '0005'
+description = 'Backfill and index email_tracking_id on event tables'
+phase = PHASE_ONLINE
+
+EVENT_TABLES = (
+    ('open_events', 'open_time'),
+    ('click_events', 'click_time'),
+)
+
+
+def upgrade(ctx):
+    for table, time_column in EVENT_TABLES:
+        ctx.backfill(
+            table,
+            'email_tracking_id = (SELECT email_tracking.id FROM email_tracking '
+            f'WHERE email_tracking.tracking_id = {table}.tracking_id)',
+            'email_tracking_id IS NULL'
+        )
+        ctx.create_index(f'ix_{table}_email_tracking_id_{time_column}', table, ['email_tracking_id', time_column])
+        ctx.add_foreign_key(f'fk_{table}_email_tracking_id', table, 'email_tracking_id', 'email_tracking', 'id')
@@ -0,0 +1,33 @@
+# Contract step: make email_tracking_id mandatory and drop the string
+# tracking_id column (with its foreign key and indexes) from the event tables.
+# Only run once no process still writes or reads events by tracking_id, i.e.
+# after the release that stops mapping the column; migrate_db.py refuses to
+# apply it while the models still map anything in ``drops``.
+
+from migrations import PHASE_CONTRACT
+
+revision = '0006'
+description = 'Drop tracking_id token from event tables (contract)'
+phase = PHASE_CONTRACT
+
+EVENT_TABLES = ('open_events', 'click_events')
+drops = tuple((table, 'tracking_id') for table in EVENT_TABLES)
+
+
+def upgrade(ctx):
+    for table in EVENT_TABLES:
+        if not ctx.has_column(table, 'tracking_id'):
+            continue
+
+        # Pick up rows written without the integer key since 0005
+        ctx.backfill(
+            table,
+            'email_tracking_id = (SELECT email_tracking.id FROM email_tracking '
+            f'WHERE email_tracking.tracking_id = {table}.tracking_id)',
+            'email_tracking_id IS NULL'
+        )
+        # Anything left has no parent row and was never reachable from the app
+        ctx.execute(f'DELETE FROM {table} WHERE email_tracking_id IS NULL')
+
+        ctx.set_not_null(table, 'email_tracking_id', 'INTEGER')
+        ctx.drop_column(table, 'tracking_id')
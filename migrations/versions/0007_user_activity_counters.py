@@ -0,0 +1,14 @@
+# Per-user counters the admin user list sorts on, maintained by send_email and
+# the public tracking routes. Adding the columns is metadata-only, so this runs
+# at startup; filling them in for existing users is 0008.
+
+revision = '0007'
+description = 'Activity counters on users (expand)'
+
+COUNTER_COLUMNS = ('tracking_count', 'total_opens', 'total_clicks')
+
+
+def upgrade(ctx):
+    for column in COUNTER_COLUMNS:
+        ctx.add_column('users', column, 'INTEGER NOT NULL DEFAULT 0')
+    ctx.add_column('users', 'last_activity', 'DATETIME NULL' if ctx.dialect != 'postgresql' else 'TIMESTAMP NULL')
@@ -0,0 +1,24 @@
+# Computes the users counters from email_tracking, once, in primary-key
+# batches. Every value is recomputed from email_tracking, so a re-run after a
+# failed batch converges on the same numbers.
+
+from migrations import PHASE_ONLINE
+
+revision = '0008'
+description = 'Backfill activity counters on users'
+phase = PHASE_ONLINE
+
+OF_USER = 'FROM email_tracking WHERE email_tracking.user_id = users.id'
+
+
+def upgrade(ctx):
+    ctx.backfill(
+        'users',
+        f'tracking_count = (SELECT COUNT(*) {OF_USER}), '
+        f'total_opens = (SELECT COALESCE(SUM(open_count), 0) {OF_USER}), '
+        f'total_clicks = (SELECT COALESCE(SUM(click_count), 0) {OF_USER}), '
+        # Later of each email's last open and last click, then the latest of those
+        'last_activity = (SELECT MAX(CASE WHEN last_click_time IS NULL OR last_open_time >= last_click_time '
+        f'THEN last_open_time ELSE last_click_time END) {OF_USER})',
+        '1 = 1'
+    )
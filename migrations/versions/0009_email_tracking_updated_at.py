@@ -0,0 +1,10 @@
+# Change marker for incremental refreshes of the tracking list. Rows keep NULL
+# until they are next written, which is fine: only later changes matter. Its
+# indexes are built online, in 0011.
+
+revision = '0009'
+description = 'updated_at on email_tracking for incremental refreshes'
+
+
+def upgrade(ctx):
+    ctx.add_column('email_tracking', 'updated_at', 'DATETIME NULL' if ctx.dialect != 'postgresql' else 'TIMESTAMP NULL')
@@ -0,0 +1,13 @@
+# Indexes behind /api/tracking/changes (0009 added the column). Built online
+# so a large email_tracking table does not hold up startup.
+
+from migrations import PHASE_ONLINE
+
+revision = '0011'
+description = 'updated_at indexes on email_tracking'
+phase = PHASE_ONLINE
+
+
+def upgrade(ctx):
+    ctx.create_index('ix_email_tracking_updated_at', 'email_tracking', ['updated_at'])
+    ctx.create_index('ix_email_tracking_user_id_updated_at', 'email_tracking', ['user_id', 'updated_at'])
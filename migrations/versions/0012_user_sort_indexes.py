@@ -0,0 +1,15 @@
+# Indexes for the admin user list: every sort column paired with id, the
+# tie-breaker, so ORDER BY ... LIMIT reads one page instead of sorting users.
+
+from migrations import PHASE_ONLINE
+
+revision = '0012'
+description = 'Sort indexes on users'
+phase = PHASE_ONLINE
+
+SORT_COLUMNS = ('created_at', 'tracking_count', 'total_opens', 'total_clicks', 'last_activity')
+
+
+def upgrade(ctx):
+    for column in SORT_COLUMNS:
+        ctx.create_index(f'ix_users_{column}_id', 'users', [column, 'id'])
@@ -0,0 +1,127 @@
+import hashlib
+import os
+import threading
+import time
+from array import array
+
+OUTCOME_ALLOWED = 'allowed'
+OUTCOME_SHED_IP = 'shed_ip'
+OUTCOME_SHED_TRACKING = 'shed_tracking'
+
+
+class SketchRateLimiter:
+    """Token buckets for an unbounded key space in a fixed amount of memory.
+
+    Keys hash to one cell in each of ``depth`` rows, count-min style. A cell
+    holds the theoretical arrival time of its bucket (the GCRA form of a token
+    bucket: one float instead of a token count plus a timestamp). Colliding
+    keys can only push a cell forward, so the minimum over a key's cells never
+    under-counts it: no key gets more than ``rate`` with ``burst``, and the
+    worst a collision does is shed some of an innocent key's requests early.
+    """
+
+    def __init__(self, rate, burst, width=65536, depth=4):
+        self.rate = rate
+        self.burst = burst
+        self.width = width
+        self.depth = depth
+        self.interval = 1.0 / rate
+        self.tolerance = self.interval * (burst - 1)
+        self._cells = array('d', [0.0]) * (width * depth)
+        # Per-process salt so clients cannot pick keys that collide on purpose
+        self._salt = os.urandom(16)
+
+    @property
+    def memory_bytes(self):
+        return self._cells.itemsize * len(self._cells)
+
+    def _indexes(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8', 'replace'), digest_size=16, key=self._salt).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [row * self.width + (h1 + row * h2) % self.width for row in range(self.depth)]
+
+    def hit(self, key, now):
+        """Take a token for ``key`` if one is available; a refused hit takes nothing."""
+        indexes = self._indexes(key)
+        arrival = max(min(self._cells[i] for i in indexes), now)
+        if arrival - now > self.tolerance:
+            return False
+
+        next_arrival = arrival + self.interval
+        for i in indexes:
+            # Conservative update: only raise cells that are behind this key
+            if self._cells[i] < next_arrival:
+                self._cells[i] = next_arrival
+        return True
+
+
+class TrackingRateLimiter:
+    """Per client IP and per tracking ID limits for the public pixel and click endpoints.
+
+    The client bucket is checked first, before the token is looked up. The
+    tracking bucket is keyed by endpoint and the resolved email_tracking.id, and only
+    consulted for tokens that exist, so a flood of made-up tokens cannot
+    fill the tracking sketch and shed real emails.
+    """
+
+    def __init__(self, ip_rate, ip_burst, tracking_rate, tracking_burst, width=65536, depth=4, enabled=True):
+        self.enabled = enabled
+        self.by_ip = SketchRateLimiter(ip_rate, ip_burst, width, depth)
+        self.by_tracking = SketchRateLimiter(tracking_rate, tracking_burst, width, depth)
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def allow_client(self, endpoint, client_ip):
+        return self._hit(endpoint, self.by_ip, client_ip or '', OUTCOME_SHED_IP)
+
+    def allow_tracking(self, endpoint, email_tracking_id):
+        # Opens and clicks get separate buckets, so proxies re-fetching the pixel
+        # cannot use up the tokens of the recipient's click. Passing both checks is
+        # what counts as an allowed (persisted) hit.
+        key = f'{endpoint}:{email_tracking_id}'
+        return self._hit(endpoint, self.by_tracking, key, OUTCOME_SHED_TRACKING, OUTCOME_ALLOWED)
+
+    def _hit(self, endpoint, limiter, key, shed_outcome, allowed_outcome=None):
+        now = time.monotonic()
+        with self._lock:
+            allowed = not self.enabled or limiter.hit(key, now)
+            outcome = allowed_outcome if allowed else shed_outcome
+            if outcome:
+                counters = self._counters.setdefault(
+                    endpoint, {OUTCOME_ALLOWED: 0, OUTCOME_SHED_IP: 0, OUTCOME_SHED_TRACKING: 0}
+                )
+                counters[outcome] += 1
+
+        return allowed
+
+    def stats(self):
+        with self._lock:
+            counters = {endpoint: dict(values) for endpoint, values in self._counters.items()}
+
+        return {
+            'enabled': self.enabled,
+            'counters': counters,
+            'limits': {
+                'ip': {'per_second': self.by_ip.rate, 'burst': self.by_ip.burst},
+                'tracking': {'per_second': self.by_tracking.rate, 'burst': self.by_tracking.burst}
+            },
+            'memory_bytes': self.by_ip.memory_bytes + self.by_tracking.memory_bytes
+        }
+
+    def reset_counters(self):
+        with self._lock:
+            self._counters.clear()
+
+
+def init_rate_limits(app):
+    app.extensions['tracking_rate_limiter'] = TrackingRateLimiter(
+        ip_rate=app.config.get('RATE_LIMIT_IP_PER_MINUTE', 600) / 60.0,
+        ip_burst=app.config.get('RATE_LIMIT_IP_BURST', 100),
+        tracking_rate=app.config.get('RATE_LIMIT_TRACKING_PER_MINUTE', 10) / 60.0,
+        tracking_burst=app.config.get('RATE_LIMIT_TRACKING_BURST', 20),
+        width=app.config.get('RATE_LIMIT_SKETCH_WIDTH', 65536),
+        depth=app.config.get('RATE_LIMIT_SKETCH_DEPTH', 4),
+        enabled=app.config.get('RATE_LIMIT_ENABLED', True)
+    )
+    return app.extensions['tracking_rate_limiter']
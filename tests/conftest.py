@@ -0,0 +1,61 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def tracker_app(tmp_path_factory):
+    """The app module on a throwaway SQLite database, imported once per session.
+
+    app.py reads its configuration from the environment at import time.
+    """
+    patch = pytest.MonkeyPatch()
+    patch.setenv('DATABASE_URL', f"sqlite:///{tmp_path_factory.mktemp('tracker') / 'tracker.db'}")
+    patch.setenv('REPLICA_DATABASE_URLS', '')
+    patch.setenv('RATE_LIMIT_ENABLED', 'false')
+
+    import app as tracker_app
+    tracker_app.create_tables()
+    yield tracker_app
+    patch.undo()
+
+
+@pytest.fixture
+def tracker(tracker_app):
+    """tracker_app with empty tables after each test."""
+    yield tracker_app
+
+    db = tracker_app.db
+    with tracker_app.app.app_context():
+        db.session.remove()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+    tracker_app.tracking_id_cache.clear()
+
+
+@pytest.fixture
+def make_user(tracker):
+    def make_user(username='sender', is_admin=False, password='secret'):
+        with tracker.app.app_context():
+            user = tracker.User(username=username, email=f'{username}@example.com', is_admin=is_admin)
+            user.set_password(password)
+            tracker.db.session.add(user)
+            tracker.db.session.commit()
+            return user.id
+
+    return make_user
+
+
+@pytest.fixture
+def login(tracker):
+    def login(username='sender', password='secret'):
+        client = tracker.app.test_client()
+        response = client.post('/login', json={'username': username, 'password': password})
+        assert response.status_code == 200
+        return client
+
+    return login
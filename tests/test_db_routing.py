@@ -0,0 +1,139 @@
+import time
+
+import pytest
+from flask import Flask, jsonify
+from flask_login import LoginManager, UserMixin, login_user
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import create_engine
+
+from db_routing import RoutingSession, init_replicas, read_replica
+
+
+class StubUser(UserMixin):
+    id = 1
+
+
+def wait_for_probe(pool, timeout=5):
+    deadline = time.monotonic() + timeout
+    while pool.lag(0) is None:
+        assert time.monotonic() < deadline, 'replica lag was never measured'
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Two SQLite files standing in for primary and replica, told apart by their rows."""
+
+    def make_app(**config):
+        primary_url = f"sqlite:///{tmp_path / 'primary.db'}"
+        replica_url = f"sqlite:///{tmp_path / 'replica.db'}"
+
+        app = Flask(__name__)
+        app.config.update(
+            SECRET_KEY='test',
+            SQLALCHEMY_DATABASE_URI=primary_url,
+            SQLALCHEMY_REPLICA_URIS=[replica_url],
+            REPLICA_MAX_LAG_SECONDS=5,
+            REPLICA_LAG_CHECK_INTERVAL=0.05,
+            READ_YOUR_WRITES_SECONDS=10,
+        )
+        app.config.update(config)
+
+        db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+        init_replicas(app)
+        login_manager = LoginManager(app)
+        login_manager.user_loader(lambda user_id: StubUser())
+
+        class Note(db.Model):
+            id = db.Column(db.Integer, primary_key=True)
+            body = db.Column(db.String(20))
+
+        with app.app_context():
+            db.create_all()
+            db.session.add(Note(body='primary'))
+            db.session.commit()
+
+        replica = create_engine(replica_url)
+        db.metadata.create_all(replica)
+        with replica.begin() as conn:
+            conn.execute(Note.__table__.insert(), {'body': 'replica'})
+        replica.dispose()
+
+        @app.route('/notes')
+        @read_replica
+        def list_notes():
+            return jsonify([note.body for note in Note.query.all()])
+
+        @app.route('/notes', methods=['POST'])
+        def add_note():
+            db.session.add(Note(body='new'))
+            db.session.commit()
+            return jsonify({'success': True})
+
+        @app.route('/login', methods=['POST'])
+        def login():
+            login_user(StubUser())
+            return jsonify({'success': True})
+
+        return app
+
+    return make_app
+
+
+def test_reads_go_to_replica(make_app):
+    app = make_app()
+    wait_for_probe(app.extensions['replica_pool'])
+
+    response = app.test_client().get('/notes')
+    assert response.get_json() == ['replica']
+    assert response.headers['X-DB-Route'] == 'replica'
+
+
+def test_override_forces_primary(make_app):
+    app = make_app()
+    wait_for_probe(app.extensions['replica_pool'])
+    client = app.test_client()
+
+    assert client.get('/notes', headers={'X-DB-Route': 'primary'}).get_json() == ['primary']
+    assert client.get('/notes?db_route=primary').get_json() == ['primary']
+
+
+def test_writes_go_to_primary_and_pin_the_writer(make_app):
+    app = make_app()
+    wait_for_probe(app.extensions['replica_pool'])
+    writer = app.test_client()
+    writer.post('/login')
+
+    writer.post('/notes')
+
+    # The writer reads its own change from the primary; other clients keep using the replica
+    response = writer.get('/notes')
+    assert response.get_json() == ['primary', 'new']
+    assert response.headers['X-DB-Route'] == 'primary'
+    assert app.test_client().get('/notes').get_json() == ['replica']
+
+
+def test_lagging_replica_falls_back_to_primary(make_app):
+    app = make_app(REPLICA_MAX_LAG_SECONDS=-1)
+    wait_for_probe(app.extensions['replica_pool'])
+
+    response = app.test_client().get('/notes')
+    assert response.get_json() == ['primary']
+    assert response.headers['X-DB-Route'] == 'primary'
+
+
+def test_slow_lag_probe_does_not_block_requests(make_app, monkeypatch):
+    app = make_app()
+    pool = app.extensions['replica_pool']
+
+    def hanging_probe(engine):
+        time.sleep(2)
+        return 0
+
+    monkeypatch.setattr(pool, 'measure_lag', hanging_probe)
+    client = app.test_client()
+
+    started = time.monotonic()
+    for _ in range(5):
+        assert client.get('/notes').get_json() == ['primary']
+    assert time.monotonic() - started < 1
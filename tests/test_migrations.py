@@ -0,0 +1,233 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+import migrations
+from migrations import MigrationContext
+
+# Schema as created by db.create_all() before the migrations package existed
+BASELINE_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, email VARCHAR(255) NOT NULL UNIQUE,
+    password_hash VARCHAR(255) NOT NULL, is_admin BOOLEAN, is_active BOOLEAN, created_at DATETIME
+);
+CREATE TABLE smtp_configs (
+    id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id), host VARCHAR(255) NOT NULL,
+    port INTEGER NOT NULL, username VARCHAR(255) NOT NULL, password VARCHAR(255) NOT NULL,
+    use_tls BOOLEAN, created_at DATETIME
+);
+CREATE TABLE email_tracking (
+    id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users (id), tracking_id VARCHAR(64) NOT NULL,
+    recipient_email VARCHAR(255) NOT NULL, subject TEXT, open_count INTEGER, click_count INTEGER,
+    last_open_time DATETIME, last_click_time DATETIME, last_ip VARCHAR(100), last_port VARCHAR(10),
+    created_at DATETIME
+);
+CREATE UNIQUE INDEX ix_email_tracking_tracking_id ON email_tracking (tracking_id);
+CREATE INDEX ix_email_tracking_user_id ON email_tracking (user_id);
+CREATE TABLE open_events (
+    id INTEGER PRIMARY KEY, tracking_id VARCHAR(64) NOT NULL REFERENCES email_tracking (tracking_id),
+    open_time DATETIME NOT NULL, ip_address VARCHAR(100), port VARCHAR(10), user_agent TEXT
+);
+CREATE INDEX ix_open_events_tracking_id ON open_events (tracking_id);
+CREATE TABLE click_events (
+    id INTEGER PRIMARY KEY, tracking_id VARCHAR(64) NOT NULL REFERENCES email_tracking (tracking_id),
+    click_time DATETIME NOT NULL, ip_address VARCHAR(100), port VARCHAR(10), user_agent TEXT
+);
+CREATE INDEX ix_click_events_tracking_id ON click_events (tracking_id);
+"""
+
+ALL_REVISIONS = ['0001', '0002', '0003', '0004', '0005', '0006', '0007', '0008', '0009', '0010', '0011', '0012']
+
+
+def quiet(message):
+    pass
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tracker.db'}")
+    with engine.begin() as conn:
+        for statement in BASELINE_SCHEMA.split(';'):
+            if statement.strip():
+                conn.execute(text(statement))
+
+        conn.execute(text("INSERT INTO users (id, username, email, password_hash) VALUES (1, 'a', 'a@x', 'h')"))
+        for i in range(1, 6):
+            conn.execute(text(
+                "INSERT INTO email_tracking (id, user_id, tracking_id, recipient_email, created_at) "
+                "VALUES (:id, 1, :token, 'r@x', CURRENT_TIMESTAMP)"
+            ), {'id': i, 'token': f'token{i}'})
+        for i in range(1, 31):
+            conn.execute(text(
+                "INSERT INTO open_events (tracking_id, open_time) VALUES (:token, CURRENT_TIMESTAMP)"
+            ), {'token': f'token{i % 5 + 1}'})
+            conn.execute(text(
+                "INSERT INTO click_events (tracking_id, click_time) VALUES (:token, CURRENT_TIMESTAMP)"
+            ), {'token': f'token{i % 5 + 1}'})
+    yield engine
+    engine.dispose()
+
+
+def index_names(engine, table):
+    return {index['name'] for index in inspect(engine).get_indexes(table)}
+
+
+def column_names(engine, table):
+    return {column['name'] for column in inspect(engine).get_columns(table)}
+
+
+def recorded(engine):
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(text('SELECT revision FROM schema_migrations ORDER BY revision'))]
+
+
+def test_upgrade_requires_base_tables(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'empty.db'}")
+    with pytest.raises(migrations.MigrationError):
+        migrations.upgrade(engine, log=quiet)
+
+
+def test_upgrade_from_baseline(engine):
+    applied = migrations.upgrade(engine, log=quiet, batch_size=7)
+
+    assert applied == ALL_REVISIONS
+    assert recorded(engine) == ALL_REVISIONS
+    assert migrations.current_revision(engine) == '0012'
+
+    assert {'ix_email_tracking_user_id_created_at', 'ix_email_tracking_updated_at'} <= index_names(engine, 'email_tracking')
+    assert {'ix_open_events_email_tracking_id_open_time', 'ix_open_events_geo_checked_at_id'} <= index_names(engine, 'open_events')
+    assert 'ix_click_events_email_tracking_id_click_time' in index_names(engine, 'click_events')
+    assert {'last_latitude', 'last_longitude', 'last_location'} <= column_names(engine, 'email_tracking')
+
+
+def test_rerun_is_noop(engine):
+    migrations.upgrade(engine, log=quiet)
+    indexes = index_names(engine, 'open_events')
+    columns = column_names(engine, 'open_events')
+
+    assert migrations.upgrade(engine, log=quiet) == []
+    assert recorded(engine) == ALL_REVISIONS
+    assert index_names(engine, 'open_events') == indexes
+    assert column_names(engine, 'open_events') == columns
+
+
+def test_target_stops_at_revision(engine):
+    assert migrations.upgrade(engine, target='0002', log=quiet) == ['0001', '0002']
+    assert migrations.current_revision(engine) == '0002'
+    assert 'ix_open_events_tracking_id_open_time' in index_names(engine, 'open_events')
+    assert 'geo_checked_at' not in column_names(engine, 'open_events')
+
+    assert migrations.upgrade(engine, target='0003', log=quiet) == ['0003']
+    assert 'geo_checked_at' in column_names(engine, 'open_events')
+
+
+def test_phases_defer_online_and_contract_steps(engine):
+    startup = migrations.upgrade(engine, log=quiet, phases=(migrations.PHASE_STARTUP,))
+    # Startup DDL after a pending online step still runs
+    assert startup == ['0001', '0003', '0004', '0007', '0009']
+    assert 'email_tracking_id' in column_names(engine, 'open_events')
+    assert 'tracking_count' in column_names(engine, 'users')
+
+    online = migrations.upgrade(engine, log=quiet, phases=(migrations.PHASE_STARTUP, migrations.PHASE_ONLINE))
+    assert online == ['0002', '0005', '0008', '0010', '0011', '0012']
+    # The old key is still there for processes running the previous release
+    assert 'tracking_id' in column_names(engine, 'open_events')
+
+
+def test_backfill_maps_events_to_integer_keys(engine):
+    migrations.upgrade(engine, target='0005', log=quiet, batch_size=4)
+
+    with engine.connect() as conn:
+        for table in ('open_events', 'click_events'):
+            mismatched = conn.execute(text(
+                f'SELECT COUNT(*) FROM {table} e JOIN email_tracking t ON t.tracking_id = e.tracking_id '
+                'WHERE e.email_tracking_id IS NULL OR e.email_tracking_id != t.id'
+            )).scalar()
+            assert mismatched == 0
+
+
+def test_contract_rebuilds_event_tables(engine):
+    migrations.upgrade(engine, target='0005', log=quiet)
+    with engine.begin() as conn:
+        # Written by an old process after the backfill, and an orphan with no parent row
+        conn.execute(text("INSERT INTO open_events (tracking_id, open_time) VALUES ('token2', CURRENT_TIMESTAMP)"))
+        conn.execute(text("INSERT INTO open_events (tracking_id, open_time) VALUES ('missing', CURRENT_TIMESTAMP)"))
+
+    assert migrations.upgrade(engine, log=quiet) == ['0006', '0007', '0008', '0009', '0010', '0011', '0012']
+
+    columns = {column['name']: column for column in inspect(engine).get_columns('open_events')}
+    assert 'tracking_id' not in columns
+    assert columns['email_tracking_id']['nullable'] is False
+    assert index_names(engine, 'open_events') == {
+        'ix_open_events_email_tracking_id_open_time', 'ix_open_events_geo_checked_at_id'
+    }
+    assert [fk['referred_columns'] for fk in inspect(engine).get_foreign_keys('open_events')] == [['id']]
+
+    with engine.connect() as conn:
+        assert conn.execute(text('SELECT COUNT(*) FROM open_events')).scalar() == 31
+        assert conn.execute(text('SELECT COUNT(*) FROM open_events WHERE email_tracking_id = 2')).scalar() == 7
+
+
+def test_backfill_user_activity_counters(engine):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, username, email, password_hash) VALUES (2, 'b', 'b@x', 'h')"))
+        conn.execute(text(
+            "UPDATE email_tracking SET open_count = id, click_count = 1, "
+            "last_open_time = '2024-01-0' || id || ' 00:00:00' WHERE id < 5"
+        ))
+        conn.execute(text("UPDATE email_tracking SET last_click_time = '2024-02-01 00:00:00' WHERE id = 2"))
+
+    migrations.upgrade(engine, target='0008', log=quiet, batch_size=1)
+
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            'SELECT id, tracking_count, total_opens, total_clicks, last_activity FROM users ORDER BY id'
+        )).all()
+    assert rows == [(1, 5, 10, 4, '2024-02-01 00:00:00'), (2, 0, 0, 0, None)]
+
+
+def test_set_not_null_and_drop_column_on_sqlite(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'rebuild.db'}")
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE parent (id INTEGER PRIMARY KEY)'))
+        conn.execute(text(
+            'CREATE TABLE child (id INTEGER PRIMARY KEY, parent_id INTEGER REFERENCES parent (id), '
+            "legacy VARCHAR(10) NOT NULL, note VARCHAR(20) DEFAULT 'n')"
+        ))
+        conn.execute(text('CREATE INDEX ix_child_parent_id ON child (parent_id)'))
+        conn.execute(text('CREATE INDEX ix_child_legacy_note ON child (legacy, note)'))
+        conn.execute(text('INSERT INTO parent (id) VALUES (1)'))
+        conn.execute(text("INSERT INTO child (id, parent_id, legacy) VALUES (1, 1, 'a'), (2, 1, 'b')"))
+
+    ctx = MigrationContext(engine, log=quiet)
+    assert ctx.set_not_null('child', 'parent_id', 'INTEGER') is True
+    assert ctx.set_not_null('child', 'parent_id', 'INTEGER') is False
+    assert ctx.is_nullable('child', 'parent_id') is False
+
+    assert ctx.drop_column('child', 'legacy') is True
+    assert ctx.drop_column('child', 'legacy') is False
+
+    assert column_names(engine, 'child') == {'id', 'parent_id', 'note'}
+    assert index_names(engine, 'child') == {'ix_child_parent_id'}
+    assert ctx.foreign_keys_on('child', 'parent_id')
+    with engine.connect() as conn:
+        assert conn.execute(text('SELECT id, parent_id, note FROM child ORDER BY id')).all() == [(1, 1, 'n'), (2, 1, 'n')]
+
+
+def test_stamp_leaves_contract_pending(engine):
+    assert migrations.stamp(engine) == ['0001', '0002', '0003', '0004', '0005', '0007', '0008', '0009', '0010', '0011', '0012']
+    assert [m.revision for m in migrations.pending_migrations(engine)] == ['0006']
+
+
+def test_contract_refuses_to_drop_mapped_columns(engine):
+    migrations.upgrade(engine, target='0005', log=quiet)
+    mapped = {('open_events', 'tracking_id'), ('open_events', 'email_tracking_id')}
+
+    with pytest.raises(migrations.MigrationError, match='open_events.tracking_id'):
+        migrations.upgrade(engine, log=quiet, mapped_columns=mapped)
+    assert 'tracking_id' in column_names(engine, 'open_events')
+    assert migrations.current_revision(engine) == '0005'
+
+    # Without contract steps the same code may keep upgrading
+    applied = migrations.upgrade(engine, log=quiet, phases=(migrations.PHASE_STARTUP, migrations.PHASE_ONLINE),
+                                 mapped_columns=mapped)
+    assert applied == ['0007', '0008', '0009', '0010', '0011', '0012']
@@ -0,0 +1,93 @@
+import random
+
+from rate_limit import SketchRateLimiter, TrackingRateLimiter
+
+
+def hits(limiter, key, now, count):
+    return sum(limiter.hit(key, now) for _ in range(count))
+
+
+def test_burst_then_rate():
+    limiter = SketchRateLimiter(rate=2, burst=5)
+
+    assert hits(limiter, 'a', 100.0, 10) == 5
+    # One token comes back every 1 / rate seconds
+    assert hits(limiter, 'a', 100.4, 10) == 0
+    assert hits(limiter, 'a', 100.5, 10) == 1
+    assert hits(limiter, 'a', 102.5, 10) == 4
+    # Idle time refills up to the burst, not beyond it
+    assert hits(limiter, 'a', 1000.0, 10) == 5
+
+
+def test_sustained_rate():
+    # Powers of two keep the float arithmetic exact
+    limiter = SketchRateLimiter(rate=4, burst=3)
+
+    allowed = sum(limiter.hit('a', 64.0 + step / 64) for step in range(641))
+    # Ten seconds of hammering: the burst plus four per second
+    assert allowed == 3 + 4 * 10
+
+
+def test_shed_hits_take_no_tokens():
+    limiter = SketchRateLimiter(rate=1, burst=2)
+    assert hits(limiter, 'a', 10.0, 2) == 2
+
+    cells = list(limiter._cells)
+    assert hits(limiter, 'a', 10.5, 1000) == 0
+    assert list(limiter._cells) == cells
+
+    # A refused flood does not delay the next token
+    assert hits(limiter, 'a', 11.0, 10) == 1
+
+
+def test_keys_are_independent():
+    limiter = SketchRateLimiter(rate=1, burst=2)
+    assert hits(limiter, 'a', 10.0, 5) == 2
+    assert hits(limiter, 'b', 10.0, 5) == 2
+
+
+def test_collisions_never_loosen_a_limit():
+    # A tiny sketch so that keys share cells all the time
+    limiter = SketchRateLimiter(rate=1, burst=3, width=4, depth=2)
+    keys = [f'key{i}' for i in range(20)]
+    allowed = dict.fromkeys(keys, 0)
+    rng = random.Random(1)
+
+    now = 0.0
+    for _ in range(5000):
+        now += 0.01
+        key = rng.choice(keys)
+        before = list(limiter._cells)
+        if limiter.hit(key, now):
+            allowed[key] += 1
+        # Conservative update only ever raises cells
+        assert all(after >= prior for after, prior in zip(limiter._cells, before))
+
+    # No key gets more than its own burst plus rate, whoever it collided with
+    assert max(allowed.values()) <= 3 + now * 1
+
+
+def test_full_collision_sheds_instead_of_sharing_tokens():
+    limiter = SketchRateLimiter(rate=1, burst=2, width=1, depth=1)
+    assert hits(limiter, 'a', 10.0, 2) == 2
+    # Every key maps to the same cell: b is shed early, a is not given more
+    assert hits(limiter, 'b', 10.0, 1) == 0
+    assert hits(limiter, 'a', 10.0, 1) == 0
+
+
+def test_opens_and_clicks_have_separate_tracking_buckets():
+    limiter = TrackingRateLimiter(ip_rate=100, ip_burst=100, tracking_rate=0.001, tracking_burst=2)
+
+    assert [limiter.allow_tracking('open', 7) for _ in range(3)] == [True, True, False]
+    # Proxies re-fetching the pixel do not use up the recipient's click
+    assert limiter.allow_tracking('click', 7) is True
+
+    counters = limiter.stats()['counters']
+    assert counters['open'] == {'allowed': 2, 'shed_ip': 0, 'shed_tracking': 1}
+    assert counters['click']['allowed'] == 1
+
+
+def test_disabled_limiter_allows_everything():
+    limiter = TrackingRateLimiter(ip_rate=0.001, ip_burst=1, tracking_rate=0.001, tracking_burst=1, enabled=False)
+    assert all(limiter.allow_client('open', '10.0.0.1') for _ in range(5))
+    assert all(limiter.allow_tracking('open', 1) for _ in range(5))
@@ -0,0 +1,78 @@
+import datetime
+
+import pytest
+
+DAY = datetime.datetime(2024, 3, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def tracking(tracker, make_user):
+    """One email with opens: five sharing a timestamp, then two on the next day."""
+    user_id = make_user()
+    with tracker.app.app_context():
+        db = tracker.db
+        tracking = tracker.EmailTracking(user_id=user_id, tracking_id='token', recipient_email='r@example.com')
+        db.session.add(tracking)
+        db.session.flush()
+
+        opens = [(DAY, '10.0.0.1')] * 5 + [(DAY + datetime.timedelta(days=1), '10.0.0.2')] * 2
+        for open_time, ip in opens:
+            db.session.add(tracker.OpenEvent(email_tracking_id=tracking.id, tracking_id='token',
+                                             open_time=open_time, ip_address=ip))
+        db.session.add(tracker.ClickEvent(email_tracking_id=tracking.id, tracking_id='token',
+                                          click_time=DAY, ip_address='10.0.0.1'))
+        db.session.commit()
+    return 'token'
+
+
+def event_ids(tracker):
+    with tracker.app.app_context():
+        return [e.id for e in tracker.OpenEvent.query.order_by(tracker.OpenEvent.open_time.desc(),
+                                                               tracker.OpenEvent.id.desc())]
+
+
+def test_cursor_pages_through_tied_timestamps(tracker, tracking, login):
+    client = login()
+
+    seen = []
+    cursor = None
+    for _ in range(10):
+        query = {'limit': 2}
+        if cursor:
+            query['cursor'] = cursor
+        data = client.get(f'/api/tracking/{tracking}/opens', query_string=query).get_json()
+        seen += [event['id'] for event in data['events']]
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+
+    # Every event exactly once, newest first, even where pages split a tie on open_time
+    assert seen == event_ids(tracker)
+
+
+def test_invalid_cursor_is_rejected(tracking, login):
+    response = login().get(f'/api/tracking/{tracking}/opens', query_string={'cursor': 'not-a-cursor'})
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_limit_is_clamped(tracker, tracking, login, monkeypatch):
+    monkeypatch.setattr(tracker, 'DETAILS_MAX_PAGE_SIZE', 3)
+    client = login()
+
+    assert len(client.get(f'/api/tracking/{tracking}/opens?limit=0').get_json()['events']) == 1
+    assert len(client.get(f'/api/tracking/{tracking}/opens?limit=1000').get_json()['events']) == 3
+    assert client.get(f'/api/tracking/{tracking}/details?limit=1000').get_json()['limit'] == 3
+
+
+def test_summary_counts_all_events(tracking, login):
+    data = login().get(f'/api/tracking/{tracking}/details', query_string={'limit': 2}).get_json()
+
+    # The summary covers every event, not just the first page
+    assert len(data['opens']) == 2
+    opens = data['summary']['opens']
+    assert opens['total'] == 7
+    assert opens['unique_ips'] == 2
+    assert opens['per_day'] == [{'date': '2024-03-01', 'count': 5}, {'date': '2024-03-02', 'count': 2}]
+    assert data['summary']['clicks']['total'] == 1
+    assert data['summary']['clicks']['per_day'] == [{'date': '2024-03-01', 'count': 1}]
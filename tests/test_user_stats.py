@@ -0,0 +1,79 @@
+import smtplib
+
+import pytest
+
+
+class FakeSMTP:
+    """Accepts everything except mail to refused@example.com."""
+
+    def __init__(self, host, port):
+        pass
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        pass
+
+    def send_message(self, msg):
+        if msg['To'] == 'refused@example.com':
+            raise smtplib.SMTPRecipientsRefused({msg['To']: (550, b'no such user')})
+
+    def quit(self):
+        pass
+
+
+@pytest.fixture
+def sender(tracker, make_user, login, monkeypatch):
+    monkeypatch.setattr(smtplib, 'SMTP', FakeSMTP)
+    user_id = make_user('sender')
+    with tracker.app.app_context():
+        tracker.db.session.add(tracker.SMTPConfig(user_id=user_id, host='smtp.example.com', port=587,
+                                                  username='sender@example.com', password='x'))
+        tracker.db.session.commit()
+    return login('sender')
+
+
+def send(client, *emails):
+    response = client.post('/api/send-email', json={
+        'subject': 'Hello', 'body': 'Hi', 'image_url': 'http://example.com/a.png', 'emails': list(emails)
+    })
+    assert response.status_code == 200
+    return [result['tracking_id'] for result in response.get_json()['results'] if result['success']]
+
+
+def counters(tracker, username):
+    with tracker.app.app_context():
+        user = tracker.User.query.filter_by(username=username).one()
+        return user.tracking_count, user.total_opens, user.total_clicks, user.last_activity is not None
+
+
+def aggregated(tracker, username):
+    with tracker.app.app_context():
+        rows = tracker.EmailTracking.query.join(tracker.User).filter(tracker.User.username == username).all()
+        return (len(rows), sum(r.open_count or 0 for r in rows), sum(r.click_count or 0 for r in rows),
+                any(r.last_open_time or r.last_click_time for r in rows))
+
+
+def test_counters_follow_send_open_click_and_clear(tracker, sender, make_user, login):
+    first, second = send(sender, 'a@example.com', 'b@example.com', 'refused@example.com')
+    # A failed delivery still leaves its tracking row, and is counted like one
+    assert counters(tracker, 'sender') == (3, 0, 0, False)
+
+    public = tracker.app.test_client()
+    for _ in range(3):
+        public.get(f'/track/{first}.gif')
+    public.get(f'/track/{second}.gif')
+    public.get(f'/click/{first}')
+    public.get('/track/unknown.gif')
+
+    assert counters(tracker, 'sender') == (3, 4, 1, True)
+    assert counters(tracker, 'sender') == aggregated(tracker, 'sender')
+
+    make_user('admin', is_admin=True)
+    admin = login('admin')
+    users = {u['username']: u for u in admin.get('/api/admin/users?sort=total_opens').get_json()['users']}
+    assert (users['sender']['tracking_count'], users['sender']['total_opens'], users['sender']['total_clicks']) == (3, 4, 1)
+
+    assert admin.post('/api/admin/clear-database', json={'confirmation': 'DELETE ALL'}).get_json()['success']
+    assert counters(tracker, 'sender') == (0, 0, 0, False)